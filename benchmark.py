@@ -0,0 +1,196 @@
+"""Headless rerun benchmark of main.py, driven through Streamlit's AppTest.
+
+    python benchmark.py [--repeat 5] [--output bench.json]
+                        [--baseline bench_baseline.json] [--save-baseline]
+
+Every scenario opens a session with the lazy sections expanded, applies its
+filter change and times the rerun it triggers, twice: cold (result cache
+emptied, every payload and chart computed) and warm (served from the cache
+the previous sessions filled, as on a busy server). Peak memory is the
+tracemalloc peak of one cold rerun; per-section seconds come from the
+payload log of that rerun.
+
+With --baseline the medians are compared to a stored run and the script
+exits with status 1 when a scenario got slower than --tolerance allows.
+Runs offline: the data is read from dados/ and no server is started.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(ROOT, 'main.py')
+# Reruns must not be answered by results a previous benchmark left on disk
+os.environ.setdefault('BMW_DISK_CACHE_MB', '0')
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import config  # noqa: E402
+from cache import result_cache  # noqa: E402
+
+OPEN_SECTIONS = ('open_correlation', 'open_fuel', 'open_color', 'open_raw')
+# Reruns faster than this are within timer noise and never flagged
+NOISE_SECONDS = 0.02
+
+
+def select_models(*models):
+    def change(at):
+        at.multiselect[0].set_value(list(models))
+    return change
+
+
+def narrow_years(at):
+    at.slider[0].set_value((2018, 2019))
+
+
+# Scenario -> filter change applied before the measured rerun (None: plain rerun)
+SCENARIOS = {
+    'all_selected': None,
+    'single_model': select_models('X1'),
+    'narrow_years': narrow_years,
+    'empty_selection': select_models(),
+    # Typed through accept_new_options; 'Foo' is not in the data
+    'unknown_models': select_models('X1', 'Foo'),
+}
+
+
+def session():
+    """A fresh session on the default view, with every lazy section open."""
+    at = AppTest.from_file(APP, default_timeout=600)
+    for key in OPEN_SECTIONS:
+        at.session_state[key] = True
+    at.run()
+    return at
+
+
+def timed_rerun(change, cold, trace=False):
+    """(seconds, tracemalloc peak or None, session) of the rerun after `change`."""
+    at = session()
+    if change:
+        change(at)
+    if cold:
+        result_cache().clear()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    at.run()
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if at.exception:
+        raise RuntimeError(f'main.py raised: {at.exception[0].value}')
+    return seconds, peak, at
+
+
+def run_scenario(change, repeat):
+    cold = [timed_rerun(change, cold=True)[0] for _ in range(repeat)]
+    warm = [timed_rerun(change, cold=False)[0] for _ in range(repeat)]
+    # Measured apart: tracing slows every allocation down
+    _, peak, at = timed_rerun(change, cold=True, trace=True)
+    state = at.session_state
+    return {
+        'cold_seconds': statistics.median(cold),
+        'warm_seconds': statistics.median(warm),
+        'cold_runs': cold,
+        'warm_runs': warm,
+        'peak_memory_bytes': peak,
+        'section_seconds': dict(state['payload_seconds']) if 'payload_seconds' in state else {},
+        'chart_bytes': dict(state['chart_bytes']) if 'chart_bytes' in state else {},
+    }
+
+
+def run_benchmark(repeat, scenarios):
+    start = time.perf_counter()
+    session()
+    startup = time.perf_counter() - start
+    results = {name: run_scenario(SCENARIOS[name], repeat) for name in scenarios}
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            name: getattr(config, name) for name in dir(config) if name.isupper()
+        },
+        'repeat': repeat,
+        'startup_seconds': startup,
+        # ru_maxrss is in KB on Linux
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'scenarios': results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every scenario against the baseline, and whether any regressed."""
+    lines = []
+    regressed = False
+    for name, current in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            lines.append(f'{name:<16} sem referência')
+            continue
+        for metric in ('cold_seconds', 'warm_seconds'):
+            new, old = current[metric], before[metric]
+            slower = new > old * (1 + tolerance) and new - old > NOISE_SECONDS
+            regressed |= slower
+            change = (new / old - 1) * 100 if old else 0.0
+            flag = '  <-- REGRESSÃO' if slower else ''
+            lines.append(f'{name:<16} {metric:<13} {old * 1000:8.1f} ms -> {new * 1000:8.1f} ms ({change:+.0f}%){flag}')
+    return lines, regressed
+
+
+def summary(results):
+    lines = [f"inicialização: {results['startup_seconds']:.2f} s, RSS máximo {results['max_rss_bytes'] / 2**20:,.0f} MB"]
+    for name, r in results['scenarios'].items():
+        slowest = max(r['section_seconds'].items(), key=lambda item: item[1], default=('-', 0.0))
+        lines.append(
+            f"{name:<16} frio {r['cold_seconds'] * 1000:8.1f} ms  quente {r['warm_seconds'] * 1000:8.1f} ms  "
+            f"pico {r['peak_memory_bytes'] / 2**20:7.1f} MB  seção mais lenta: {slowest[0]} ({slowest[1] * 1000:.1f} ms)"
+        )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='measured reruns per scenario and mode')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='run only these scenarios')
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--baseline', default=os.path.join(ROOT, 'bench_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+    args = parser.parse_args(argv)
+
+    # The app reads dados/ relative to the working directory
+    os.chdir(ROOT)
+    logging.disable(logging.WARNING)
+    results = run_benchmark(args.repeat, args.scenario or list(SCENARIOS))
+    print('\n'.join(summary(results)))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'referência gravada em {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print('sem arquivo de referência; use --save-baseline para criar um')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    lines, regressed = compare(results, baseline, args.tolerance)
+    print('\n'.join(lines))
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
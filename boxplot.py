@@ -0,0 +1,79 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from cube import rollup
+from sketch import merged_quantiles
+
+BOX_COLUMNS = ['lower', 'q1', 'median', 'q3', 'upper']
+
+
+def fences(stats):
+    """Tukey fences: 1.5 IQR past the quartiles."""
+    iqr = stats['q3'] - stats['q1']
+    return stats['q1'] - 1.5 * iqr, stats['q3'] + 1.5 * iqr
+
+
+def sketch_box_stats(sketch, sketch_cells, cells, by):
+    """Five numbers per group of `by` from merged sketches; min and max come exact from the cube.
+
+    Whiskers end at the exact min or max when it lies inside the Tukey
+    fence. Otherwise the sketch only tells which buckets hold data, so the
+    whisker stops at the outer edge of the outermost populated bucket lying
+    wholly inside the fence (at the fence itself when no bucket does).
+    """
+    quartiles = merged_quantiles(sketch, sketch_cells, [by], [0.25, 0.5, 0.75])
+    quartiles.columns = ['q1', 'median', 'q3']
+    extent = rollup(cells, [by]).set_index(by)
+    stats = quartiles.join(extent[['price_min', 'price_max']])
+    low_fence, high_fence = fences(stats)
+
+    buckets = sketch_cells.groupby([by, 'bucket'], observed=True)['count'].sum()
+    buckets = buckets[buckets > 0].reset_index()
+    group = buckets[by].to_numpy()
+    bucket_low = sketch.edges[buckets['bucket'].to_numpy()]
+    bucket_high = sketch.edges[buckets['bucket'].to_numpy() + 1]
+    inside_low = bucket_low >= low_fence.reindex(group).to_numpy()
+    inside_high = bucket_high <= high_fence.reindex(group).to_numpy()
+    lower = pd.Series(bucket_low[inside_low]).groupby(group[inside_low]).min().reindex(stats.index)
+    upper = pd.Series(bucket_high[inside_high]).groupby(group[inside_high]).max().reindex(stats.index)
+    lower = lower.fillna(low_fence).where(stats['price_min'] < low_fence, stats['price_min'])
+    upper = upper.fillna(high_fence).where(stats['price_max'] > high_fence, stats['price_max'])
+
+    stats['lower'] = np.minimum(lower, stats['q1'])
+    stats['upper'] = np.maximum(upper, stats['q3'])
+    return stats[BOX_COLUMNS].reset_index()
+
+
+def exact_box_stats(frame, by, column):
+    """Five numbers per group of `by` computed from the rows themselves.
+
+    Tukey whiskers: the most extreme values inside the 1.5 IQR fences.
+    """
+    grouped = frame.groupby(by, observed=True)[column]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    low_fence, high_fence = fences(stats)
+    keys = frame[by]
+    values = frame[column]
+    stats['lower'] = values[values >= low_fence.reindex(keys).to_numpy()].groupby(keys, observed=True).min()
+    stats['upper'] = values[values <= high_fence.reindex(keys).to_numpy()].groupby(keys, observed=True).max()
+    return stats[BOX_COLUMNS].reset_index()
+
+
+def boxplot_chart(stats, x, y_title, size, color=None):
+    """Boxplot of precomputed five-number stats: whisker rule, quartile box and median tick."""
+    y_scale = alt.Scale(zero=False)
+    tooltip = [alt.Tooltip(f'{x.shorthand}'), *[alt.Tooltip(f'{c}:Q', format=',.0f') for c in BOX_COLUMNS]]
+    base = alt.Chart(stats).encode(x=x, tooltip=tooltip)
+    rule = base.mark_rule().encode(
+        y=alt.Y('lower:Q', title=y_title, scale=y_scale),
+        y2='upper:Q'
+    )
+    box = base.mark_bar(size=size).encode(
+        y=alt.Y('q1:Q', title=y_title, scale=y_scale),
+        y2='q3:Q',
+        **({'color': color} if color is not None else {})
+    )
+    median = base.mark_tick(color='white', size=size).encode(y='median:Q')
+    return alt.layer(rule, box, median)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from loader import LOOKUP_FILES
+
+
+def sort_key(frame, column, labels):
+    """Values that order `column` the way it is displayed (lookup ids by their label)."""
+    values = frame[column]
+    if column in LOOKUP_FILES:
+        # Category codes follow the alphabetical order of the labels
+        return labels[column].codes[values.to_numpy()]
+    if hasattr(values, 'cat'):
+        return values.cat.codes.to_numpy()
+    return values.to_numpy()
+
+
+def page_positions(frame, labels, sort_by, ascending, start, stop):
+    """Positions in `frame` of rows [start, stop) of the requested order."""
+    if sort_by is None:
+        return np.arange(start, stop)
+    key = sort_key(frame, sort_by, labels).astype(np.float64)
+    if not ascending:
+        key = -key
+    # Only the rows up to the stop-th smallest key need to be ordered
+    head = np.arange(len(key))
+    if stop < len(key):
+        bound = np.partition(key, stop - 1)[stop - 1]
+        if not np.isnan(bound):
+            head = np.flatnonzero(key <= bound)
+    # Stable, so tied rows keep their row order and consecutive pages never overlap
+    head = head[np.argsort(key[head], kind='stable')]
+    return head[start:stop]
+
+
+def decode_labels(page, labels):
+    """Replace lookup ids with their labels on the (small) page only."""
+    page = page.copy()
+    for column in LOOKUP_FILES:
+        if column in page:
+            page[column] = labels[column].decode(page[column].to_numpy())
+    return page
+
+
+def raw_page(frame, labels, columns, sort_by=None, ascending=True, page=1, page_size=50):
+    """One page of `frame` with only `columns`, ids decoded to labels."""
+    start = (page - 1) * page_size
+    stop = min(start + page_size, len(frame))
+    positions = page_positions(frame, labels, sort_by, ascending, start, stop)
+    return decode_labels(frame.iloc[positions][columns], labels)
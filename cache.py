@@ -0,0 +1,255 @@
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import re
+import shutil
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import config
+
+
+def estimate_bytes(value):
+    """Rough resident size of a cached payload."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU of computed results with a memory budget in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = estimate_bytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # Computed outside the lock; concurrent misses may compute twice.
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Marks the fingerprint directories DiskCache created; it never removes anything else
+CACHE_MARKER = '.bmw-result-cache'
+FINGERPRINT = re.compile(r'[0-9a-f]{16}')
+# Another fingerprint's directory is only removed once unused this long: a
+# server with other data may share the cache directory
+STALE_SECONDS = 24 * 60 * 60
+
+
+def stale_cache_dir(path):
+    """True for a fingerprint directory made by DiskCache and unused for STALE_SECONDS."""
+    if not FINGERPRINT.fullmatch(os.path.basename(path)):
+        return False
+    try:
+        used = os.stat(os.path.join(path, CACHE_MARKER)).st_mtime
+    except OSError:
+        return False
+    return time.time() - used > STALE_SECONDS
+
+
+class DiskCache:
+    """Results pickled and zlib-compressed under `<directory>/<data fingerprint>/`.
+
+    Entries survive restarts for as long as the csv files keep the same
+    fingerprint. On start, the directories of other fingerprints are
+    removed once no server has used them for STALE_SECONDS; only
+    directories holding the CACHE_MARKER are ever touched. The least
+    recently read entries are evicted past `max_bytes`.
+    """
+
+    def __init__(self, directory, fingerprint, max_bytes):
+        self.directory = os.path.join(directory, fingerprint)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._marker = os.path.join(self.directory, CACHE_MARKER)
+        os.makedirs(self.directory, exist_ok=True)
+        self._mark_used()
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name != fingerprint and stale_cache_dir(path):
+                shutil.rmtree(path, ignore_errors=True)
+        self._bytes = sum(size for _, _, size in self._entries())
+
+    def _mark_used(self):
+        try:
+            with open(self._marker, 'a'):
+                os.utime(self._marker)
+        except OSError:
+            pass
+
+    def _entries(self):
+        """(last use, path, size) of every stored entry."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + '.bin')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path)  # mark as recently used
+            self._mark_used()
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        except Exception:
+            # Truncated or unreadable blob: drop it and recompute
+            self.misses += 1
+            self._remove(path)
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        blob = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        if len(blob) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError:
+            return  # read-only or full disk: the cache is best effort
+        self._mark_used()
+        with self._lock:
+            self._bytes += len(blob) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes -= size
+
+    def _evict(self):
+        # Rescan: other processes may share the directory
+        entries = sorted(self._entries())
+        self._bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._bytes -= size
+
+    def stats(self):
+        return {'bytes': self._bytes, 'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+@st.cache_resource
+def result_cache():
+    """Process-wide cache shared by every session."""
+    return ResultCache(config.RESULT_CACHE_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def disk_cache(fingerprint):
+    """On-disk cache for the data identified by `fingerprint`, or None when disabled."""
+    if config.DISK_CACHE_MB <= 0:
+        return None
+    try:
+        return DiskCache(config.DISK_CACHE_DIR, fingerprint, config.DISK_CACHE_MB * 1024 * 1024)
+    except OSError:
+        return None
+
+
+def cached_result(key, fingerprint, compute):
+    """Memory LRU first, then the disk cache, then `compute()`."""
+    memory = result_cache()
+    missing = object()
+    value = memory.get(key, missing)
+    if value is missing:
+        disk = disk_cache(fingerprint)
+        value = disk.get(key, missing) if disk else missing
+        if value is missing:
+            value = compute()
+            if disk:
+                disk.put(key, value)
+        memory.put(key, value)
+    return value
@@ -0,0 +1,86 @@
+"""Charts compiled once per aggregated input and sent as Vega-Lite plus Arrow.
+
+Every transform (aggregation, regression, quartiles, binning) already runs in
+the payload sections, so the charts only carry their final marks. Compiling
+an Altair chart (schema validation, to_dict, Arrow encoding) still costs
+more than the payloads themselves, so the compiled spec is kept in the
+process-wide result cache under the key of the payload it was built from.
+"""
+from contextlib import nullcontext
+import copy
+import hashlib
+import json
+import threading
+
+import altair as alt
+import pyarrow as pa
+import streamlit as st
+from streamlit.dataframe_util import convert_anything_to_arrow_bytes
+
+from cache import result_cache
+from profiling import record
+
+# Altair's data transformer and theme registries are global
+_altair_lock = threading.Lock()
+
+
+def arrow_bytes(frame):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _arrow_dataset(data, datasets):
+    """Altair data transformer storing each frame as Arrow under a content hash."""
+    blob = arrow_bytes(data)
+    name = hashlib.sha1(blob).hexdigest()
+    datasets[name] = blob
+    return {'name': name}
+
+
+alt.data_transformers.register('arrow_dataset', _arrow_dataset)
+
+
+def compile_chart(chart):
+    """Vega-Lite spec of `chart` (without data) and its datasets as Arrow bytes."""
+    datasets = {}
+    with _altair_lock:
+        # Streamlit applies its own theme; Altair's default one would fix the size
+        theme = alt.theme.enable('none') if alt.theme.active == 'default' else nullcontext()
+        with theme, alt.data_transformers.enable('arrow_dataset', datasets=datasets):
+            spec = chart.to_dict()
+    spec.pop('datasets', None)
+    size = len(json.dumps(spec)) + sum(len(blob) for blob in datasets.values())
+    return {'spec': spec, 'datasets': datasets, 'bytes': size}
+
+
+def reset_chart_log():
+    st.session_state['chart_bytes'] = {}
+
+
+def chart_log():
+    """Chart name -> payload bytes sent in the current run."""
+    return st.session_state.setdefault('chart_bytes', {})
+
+
+def show_chart(name, input_key, chart, **kwargs):
+    """Render `chart`, built from the aggregated input identified by `input_key`.
+
+    The chart is only compiled the first time `name` meets that input;
+    `kwargs` go to st.vega_lite_chart.
+    """
+    compiled = result_cache().get_or_compute(('chart', name, input_key), lambda: compile_chart(chart))
+    chart_log()[name] = compiled['bytes']
+    record(chart_bytes=compiled['bytes'])
+    # Streamlit takes the datasets out of the spec it receives
+    spec = copy.deepcopy(compiled['spec'])
+    spec['datasets'] = dict(compiled['datasets'])
+    st.vega_lite_chart(spec, **kwargs)
+
+
+def show_table(frame, **kwargs):
+    """st.dataframe(frame), with its rows and the Arrow bytes it sends added to the section profile."""
+    record(rows_out=len(frame), chart_bytes=len(convert_anything_to_arrow_bytes(frame)))
+    st.dataframe(frame, **kwargs)
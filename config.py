@@ -0,0 +1,51 @@
+import os
+
+# Deployment settings, overridable through environment variables.
+
+# Directory holding df.csv and the lookup csvs (e.g. a dataset written by synth.py)
+DATA_DIR = os.environ.get('BMW_DATA_DIR', 'dados')
+
+# Memory budget of the process-wide result cache, in MB
+RESULT_CACHE_MB = int(os.environ.get('BMW_RESULT_CACHE_MB', '256'))
+
+# Persistent result cache; BMW_DISK_CACHE_MB=0 disables it
+DISK_CACHE_DIR = os.environ.get('BMW_DISK_CACHE_DIR', os.path.join(DATA_DIR, '.cache'))
+DISK_CACHE_MB = int(os.environ.get('BMW_DISK_CACHE_MB', '512'))
+
+# Price vs Mileage scatters: above SCATTER_MAX_POINTS rows (0 = never) the
+# browser gets 2D bins ('bins') or a stratified sample ('sample') instead
+SCATTER_MAX_POINTS = int(os.environ.get('BMW_SCATTER_MAX_POINTS', '5000'))
+SCATTER_MODE = os.environ.get('BMW_SCATTER_MODE', 'bins')
+SCATTER_BINS = int(os.environ.get('BMW_SCATTER_BINS', '40'))
+
+# Filter panel: 'live' reruns on every widget change, 'batch' stages the
+# edits in a form and applies them together with one button
+FILTER_APPLY_MODE = os.environ.get('BMW_FILTER_APPLY_MODE', 'live')
+
+# Ingestion: 'memory' loads df.csv as one frame; 'stream' folds it chunk by
+# chunk into the aggregates and keeps no rows (the raw browser is disabled)
+INGEST_MODE = os.environ.get('BMW_INGEST_MODE', 'memory')
+CHUNK_ROWS = int(os.environ.get('BMW_CHUNK_ROWS', '200000'))
+
+# Spearman and Kendall on large selections use a uniform sample just big
+# enough to stay within this error at 95% confidence (0 = always every row)
+RANK_MAX_ERROR = float(os.environ.get('BMW_RANK_MAX_ERROR', '0.01'))
+
+# Correlations of selections up to this many rows trim them to their own
+# 1%/99% quantiles of Mileage and Price, as the original view did; larger
+# selections (and streamed data) use the dataset-wide bounds, which merge
+# from the cube's co-moments
+EXACT_TRIM_ROWS = int(os.environ.get('BMW_EXACT_TRIM_ROWS', '50000'))
+
+# Per-section profile of every rerun: a debug table in the sidebar
+# (BMW_PROFILE_SIDEBAR=1) and one JSON line per rerun appended to
+# BMW_PROFILE_LOG (empty = no log)
+PROFILE_SIDEBAR = os.environ.get('BMW_PROFILE_SIDEBAR', '0') == '1'
+PROFILE_LOG = os.environ.get('BMW_PROFILE_LOG', '')
+
+# Independent sections of a rerun (region summary, regional insights,
+# correlation, fuel, colours): 'serial' computes each payload when its
+# section renders, 'thread' computes them together in a pool of
+# SECTION_WORKERS threads shared by the sessions
+SECTION_EXECUTOR = os.environ.get('BMW_SECTION_EXECUTOR', 'serial')
+SECTION_WORKERS = int(os.environ.get('BMW_SECTION_WORKERS', '4'))
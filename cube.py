@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from moments import MOMENT_COLUMNS, row_moments
+
+CUBE_DIMENSIONS = ['Model', 'Year', 'Region', 'Transmission', 'Sales_Classification', 'Fuel_Type', 'Color']
+
+# How each cell measure rolls up; all of them are mergeable.
+CELL_AGGREGATES = {
+    'count': 'sum',
+    'price_sum': 'sum',
+    'price_sq_sum': 'sum',
+    'price_min': 'min',
+    'price_max': 'max',
+    'volume_sum': 'sum',
+    'revenue_sum': 'sum',
+}
+# Co-moments ride along in the cube but are only summed when asked for.
+CUBE_AGGREGATES = {**CELL_AGGREGATES, **{column: 'sum' for column in MOMENT_COLUMNS}}
+
+
+def row_cells(df, trim=None):
+    """One single-row cell per sale, ready to be reduced by reduce_cells.
+
+    `trim` (column -> (low, high)) limits the rows entering the co-moments.
+    """
+    price = df['Price_USD'].to_numpy(dtype=np.int64)
+    volume = df['Sales_Volume'].to_numpy(dtype=np.int64)
+    cells = df[CUBE_DIMENSIONS].copy()
+    cells['count'] = np.ones(len(df), dtype=np.int64)
+    cells['price_sum'] = price
+    cells['price_sq_sum'] = price * price
+    cells['price_min'] = price
+    cells['price_max'] = price
+    cells['volume_sum'] = volume
+    cells['revenue_sum'] = price * volume
+    for column, values in row_moments(df, trim).items():
+        cells[column] = values
+    return cells
+
+
+def reduce_cells(cells, by=CUBE_DIMENSIONS, aggregates=CELL_AGGREGATES):
+    return (
+        cells.groupby(by, observed=True, sort=False)[list(aggregates)]
+        .agg(aggregates)
+        .reset_index()
+    )
+
+
+def build_cube(df, trim=None):
+    """Model x Year x Region x Transmission x Sales_Classification x Fuel_Type x Color cells."""
+    return reduce_cells(row_cells(df, trim), aggregates=CUBE_AGGREGATES)
+
+
+def merge_cubes(*cubes):
+    return reduce_cells(pd.concat(cubes, ignore_index=True), aggregates=CUBE_AGGREGATES)
+
+
+def rollup(cells, by):
+    """Roll filtered cells up to `by`, adding mean, variance and std of the price."""
+    stats = reduce_cells(cells, by)
+    count = stats['count'].astype('float64')
+    price_sum = stats['price_sum'].astype('float64')
+    stats['price_mean'] = price_sum / count
+    stats['volume_mean'] = stats['volume_sum'] / count
+    sq_dev = (stats['price_sq_sum'] - price_sum * price_sum / count).clip(lower=0)
+    stats['price_var'] = (sq_dev / (count - 1)).where(count > 1)
+    stats['price_std'] = np.sqrt(stats['price_var'])
+    return stats
+
+
+def attach_labels(stats, dimension, labels, extra=()):
+    """Decode the ids of an aggregated frame in place of `dimension`, sorted by label."""
+    stats = stats.assign(**{dimension: labels.decode(stats[dimension])})
+    return stats.sort_values([*extra, dimension], ignore_index=True)
+
+
+def rollup_with_labels(cells, dimension, labels, extra=()):
+    """rollup() by a lookup dimension (grouping on its ids), then attach_labels()."""
+    return attach_labels(rollup(cells, [*extra, dimension]), dimension, labels, extra)
+
+
+def totals(cells):
+    """Grand totals of the filtered cells as a Series."""
+    return cells[list(CELL_AGGREGATES)].agg(CELL_AGGREGATES)
@@ -0,0 +1,158 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+INDEXED_COLUMNS = ('Model', 'Region', 'Transmission', 'Sales_Classification', 'Fuel_Type', 'Color', 'Year')
+
+
+class FilterState(NamedTuple):
+    """Canonical form of the sidebar filters: sorted, de-duplicated, hashable."""
+    models: tuple
+    regions: tuple
+    transmissions: tuple
+    sales_classifications: tuple
+    year_range: tuple
+
+
+def filter_state(models, regions, transmissions, sales_classifications, year_range):
+    def canon(values):
+        return tuple(sorted({str(v) for v in values}))
+
+    return FilterState(
+        canon(models),
+        canon(regions),
+        canon(transmissions),
+        canon(sales_classifications),
+        (int(year_range[0]), int(year_range[1])),
+    )
+
+
+def label_ids(lookup, column, labels):
+    """Ids of the lookup rows whose label is in `labels`."""
+    return lookup.loc[lookup[column].isin(labels), 'Id'].to_numpy()
+
+
+def dimension_filters(lookups, state):
+    """(column, accepted values) for every dimension the state restricts.
+
+    An empty selection means "no filter" for that dimension, as the
+    multiselects always behaved.
+    """
+    selections = (
+        ('Region', state.regions),
+        ('Transmission', state.transmissions),
+        ('Sales_Classification', state.sales_classifications),
+    )
+    restricted = []
+    if state.models:
+        restricted.append(('Model', list(state.models)))
+    for column, labels in selections:
+        if labels:
+            restricted.append((column, label_ids(lookups[column], column, labels).tolist()))
+    return restricted
+
+
+def build_index(df):
+    """Inverted index: column -> {value: sorted int32 row ids of the rows holding it}.
+
+    Only the INDEXED_COLUMNS present in `df` are indexed.
+    """
+    index = {}
+    for column in INDEXED_COLUMNS:
+        if column not in df:
+            continue
+        codes, uniques = pd.factorize(df[column], sort=True)
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        index[column] = {
+            value: order[bounds[i]:bounds[i + 1]]
+            for i, value in enumerate(pd.Index(uniques).tolist())
+        }
+    return index
+
+
+def extend_index(index, tail_index, first_row):
+    """`index` plus the postings of rows appended at `first_row`; untouched lists are shared."""
+    extended = {}
+    for column, postings in index.items():
+        postings = dict(postings)
+        for value, rows in tail_index[column].items():
+            rows = rows + np.int32(first_row)
+            postings[value] = np.concatenate([postings[value], rows]) if value in postings else rows
+        extended[column] = postings
+    return extended
+
+
+def union_rows(postings, n_rows):
+    """Union of disjoint sorted posting lists as sorted row ids."""
+    if len(postings) == 1:
+        return postings[0]
+    total = sum(len(p) for p in postings)
+    if total > n_rows // 8:
+        bitmap = np.zeros(n_rows, dtype=bool)
+        for rows in postings:
+            bitmap[rows] = True
+        return np.flatnonzero(bitmap).astype(np.int32)
+    return np.sort(np.concatenate(postings))
+
+
+def intersect_rows(small, large):
+    """Rows of `small` also present in `large`, O(len(small) * log(len(large)))."""
+    if not len(large):
+        return large
+    pos = np.searchsorted(large, small).clip(max=len(large) - 1)
+    return small[large[pos] == small]
+
+
+def index_rows(index, n_rows, lookups, state):
+    """Sorted row ids matching `state`, or None when nothing is filtered out."""
+    first_year, last_year = state.year_range
+    restricted = dimension_filters(lookups, state)
+    restricted.append(('Year', range(first_year, last_year + 1)))
+    per_dimension = []
+    for column, values in restricted:
+        if column not in index:
+            continue  # not a dimension of this frame
+        postings = index[column]
+        selected = [postings[v] for v in values if v in postings]
+        if len(selected) == len(postings):
+            continue  # every value selected, the dimension filters nothing
+        if not selected:
+            return np.empty(0, dtype=np.int32)
+        per_dimension.append(union_rows(selected, n_rows))
+    if not per_dimension:
+        return None
+    # Intersect starting from the narrowest dimension
+    per_dimension.sort(key=len)
+    rows = per_dimension[0]
+    for other in per_dimension[1:]:
+        rows = intersect_rows(rows, other)
+        if not len(rows):
+            break
+    return rows
+
+
+def build_mask(df, lookups, state):
+    """One boolean mask combining every filter predicate."""
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in dimension_filters(lookups, state):
+        mask &= df[column].isin(values).to_numpy()
+    year = df['Year'].to_numpy()
+    first_year, last_year = state.year_range
+    mask &= (year >= first_year) & (year <= last_year)
+    return mask
+
+
+def apply_filters(df, lookups, state, index=None):
+    """Rows of `df` matching `state`, resolved through `index` when given.
+
+    With an index and no effective filter the shared frame itself is
+    returned, so callers must not modify the result in place.
+    """
+    if index is None:
+        return df[build_mask(df, lookups, state)]
+    rows = index_rows(index, len(df), lookups, state)
+    if rows is None:
+        return df
+    return df.take(rows)
@@ -0,0 +1,41 @@
+import numpy as np
+
+from cube import rollup
+
+
+def extremes(stats, key, column):
+    """(key, value) of the largest and the smallest `column`, ignoring NaN."""
+    values = stats[column].to_numpy(dtype='float64')
+    if np.isnan(values).all():
+        first = (stats[key].iloc[0], values[0])
+        return first, first
+    hi, lo = np.nanargmax(values), np.nanargmin(values)
+    return (stats[key].iloc[hi], values[hi]), (stats[key].iloc[lo], values[lo])
+
+
+def compute_kpis(cells):
+    """Winner and loser of every KPI card from one Model and one Year roll-up.
+
+    Returns card name -> (label, value).
+    """
+    by_model = rollup(cells, ['Model']).sort_values('Model', ignore_index=True)
+    by_year = rollup(cells, ['Year']).sort_values('Year', ignore_index=True)
+
+    highest_price, lowest_price = extremes(by_model, 'Model', 'price_mean')
+    highest_variance, lowest_variance = extremes(by_model, 'Model', 'price_var')
+    highest_revenue, lowest_revenue = extremes(by_model, 'Model', 'revenue_sum')
+    best_year, worst_year = extremes(by_year, 'Year', 'revenue_sum')
+    (top_volume_model, top_volume), _ = extremes(by_model, 'Model', 'volume_sum')
+    market_share = top_volume / by_model['volume_sum'].sum() * 100
+
+    return {
+        'highest_price': highest_price,
+        'lowest_price': lowest_price,
+        'highest_variance': highest_variance,
+        'lowest_variance': lowest_variance,
+        'top_market_share': (top_volume_model, market_share),
+        'highest_revenue': highest_revenue,
+        'lowest_revenue': lowest_revenue,
+        'best_year': best_year,
+        'worst_year': worst_year,
+    }
@@ -0,0 +1,368 @@
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import config
+from cube import build_cube
+from filters import build_index
+from sketch import SKETCHED_COLUMNS, build_histogram, build_sketches, trim_bounds
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # snapshots are optional, fall back to parsing the csv
+    pa = None
+
+DATA_DIR = config.DATA_DIR
+SALES_FILE = 'df.csv'
+
+# Lookup tables: dimension column in df.csv -> csv with (label, Id)
+LOOKUP_FILES = {
+    'Region': 'df_region.csv',
+    'Transmission': 'df_transmission.csv',
+    'Sales_Classification': 'df_sales_classification.csv',
+    'Fuel_Type': 'df_fuel_type.csv',
+    'Color': 'df_color.csv',
+}
+
+# Compact dtypes for df.csv. The ID columns have a handful of values each,
+# so int8 is enough; prices, mileage and volumes fit comfortably in int32.
+SALES_DTYPES = {
+    'Model': 'category',
+    'Year': 'int16',
+    'Engine_Size_L': 'float32',
+    'Mileage_KM': 'int32',
+    'Price_USD': 'int32',
+    'Sales_Volume': 'int32',
+    'Sales_Classification': 'int8',
+    'Fuel_Type': 'int8',
+    'Color': 'int8',
+    'Transmission': 'int8',
+    'Region': 'int8',
+}
+
+
+class LabelDictionary(NamedTuple):
+    """A lookup table as a shared categorical: labels in alphabetical order and id -> code."""
+    dtype: pd.CategoricalDtype
+    codes: np.ndarray
+
+    @classmethod
+    def from_lookup(cls, lookup, column):
+        labels = sorted(lookup[column].astype(str))
+        codes = np.full(int(lookup['Id'].max()) + 1, -1, dtype=np.int16)
+        codes[lookup['Id'].to_numpy()] = [labels.index(label) for label in lookup[column].astype(str)]
+        return cls(pd.CategoricalDtype(labels), codes)
+
+    def decode(self, ids):
+        """Labels of `ids` as a Categorical sharing this dictionary's dtype."""
+        return pd.Categorical.from_codes(self.codes[np.asarray(ids)], dtype=self.dtype)
+
+
+@dataclass
+class Dataset:
+    """Everything the dashboard reads; `df` is None when the rows were streamed."""
+    df: pd.DataFrame
+    lookups: dict
+    labels: dict = field(default_factory=dict)
+    version: str = ''
+    # data_fingerprint() at load; appends change `version` only, so this
+    # stays what a restart on the same files computes until the next reload
+    fingerprint: str = ''
+    index: dict = field(default_factory=dict)
+    cube: pd.DataFrame = None
+    cube_index: dict = field(default_factory=dict)
+    sketches: dict = field(default_factory=dict)
+    # Column -> (low, high) of the rows entering the cube's co-moments
+    trim: dict = field(default_factory=dict)
+    scatter_grid: object = None
+    memory: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    ingest: dict = field(default_factory=dict)
+    source: dict = field(default_factory=dict)
+    refresh: dict = field(default_factory=dict)
+    # Rows appended since the load, as (frame, index) chunks not yet merged into df
+    tails: tuple = ()
+
+    @property
+    def streamed(self):
+        return self.df is None
+
+    def row_chunks(self):
+        """(frame, inverted index) of the loaded rows, then of every appended chunk."""
+        return [(self.df, self.index), *self.tails]
+
+
+def data_path(name):
+    return os.path.join(DATA_DIR, name)
+
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+
+def with_models(frame, dtype):
+    """`frame` with its Model column recoded to `dtype` (a no-op when already equal)."""
+    if frame['Model'].dtype == dtype:
+        return frame
+    return frame.assign(Model=frame['Model'].cat.set_categories(dtype.categories))
+
+
+def read_sales(path=None):
+    """Read df.csv with the compact dtypes, returning (df, bytes with default dtypes)."""
+    raw = pd.read_csv(path or data_path(SALES_FILE))
+    default_bytes = frame_bytes(raw)
+    return raw.astype(SALES_DTYPES), default_bytes
+
+
+def read_lookup(path):
+    lookup = pd.read_csv(path)
+    lookup['Id'] = lookup['Id'].astype('int8')
+    return lookup, frame_bytes(lookup)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def rows_end_offset(path, rows):
+    """Byte offset just past the header and the first `rows` data lines of a csv."""
+    needed = rows + 1
+    offset = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            count = block.count(b'\n')
+            if count >= needed:
+                position = -1
+                for _ in range(needed):
+                    position = block.index(b'\n', position + 1)
+                return offset + position + 1
+            needed -= count
+            offset += len(block)
+    return offset
+
+
+def prefix_digest(path, end, length=1 << 16):
+    """sha256 of the `length` bytes before `end`, to tell an append from a rewrite."""
+    with open(path, 'rb') as f:
+        f.seek(max(0, end - length))
+        return hashlib.sha256(f.read(end - max(0, end - length))).hexdigest()
+
+
+def snapshot_offset(name, rows):
+    """End offset of the first `rows` rows recorded by the snapshot of an untouched csv, or None."""
+    _, meta_path = snapshot_paths(name)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        stat = os.stat(data_path(name))
+    except (OSError, ValueError):
+        return None
+    if (meta.get('mtime_ns'), meta.get('size'), meta.get('rows')) != (stat.st_mtime_ns, stat.st_size, rows):
+        return None
+    return meta.get('offset')
+
+
+def sales_source(rows):
+    """Where the loaded rows of df.csv end, so later appends can be read alone."""
+    path = data_path(SALES_FILE)
+    offset = snapshot_offset(SALES_FILE, rows)
+    if offset is None:
+        offset = rows_end_offset(path, rows)
+    lookups = {name: os.stat(data_path(name)).st_mtime_ns for name in LOOKUP_FILES.values()}
+    return {'offset': offset, 'digest': prefix_digest(path, offset), 'rows': rows, 'lookups': lookups}
+
+
+def csv_sha256(name):
+    """sha256 of a csv in dados/, reusing the snapshot's record when the file is untouched."""
+    path = data_path(name)
+    _, meta_path = snapshot_paths(name)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        stat = os.stat(path)
+        if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+            return meta['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+    return file_sha256(path)
+
+
+def data_fingerprint():
+    """Identifies the contents of every csv in dados/ the dashboard reads."""
+    digest = hashlib.sha256()
+    for name in [SALES_FILE, *LOOKUP_FILES.values()]:
+        digest.update(f'{name}:{csv_sha256(name)};'.encode())
+    return digest.hexdigest()[:16]
+
+
+def snapshot_paths(name, data_dir=DATA_DIR):
+    base = os.path.join(data_dir, '.snapshot', os.path.splitext(name)[0])
+    return base + '.arrow', base + '.json'
+
+
+def snapshot_is_fresh(csv_path, meta_path):
+    """True when the snapshot matches the csv, checked by mtime/size first and sha256 second."""
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False, None
+    stat = os.stat(csv_path)
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return True, meta
+    # Touched but maybe not modified (git checkout, copy): compare contents.
+    if meta.get('sha256') != file_sha256(csv_path):
+        return False, None
+    meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    write_json_atomic(meta_path, meta)
+    return True, meta
+
+
+def write_json_atomic(path, payload):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def write_snapshot(frame, csv_path, arrow_path, meta_path, default_bytes):
+    os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+    stat = os.stat(csv_path)
+    tmp = f'{arrow_path}.{os.getpid()}.tmp'
+    # Uncompressed so the file can be memory-mapped without decoding.
+    feather.write_feather(frame, tmp, compression='uncompressed')
+    os.replace(tmp, arrow_path)
+    write_json_atomic(meta_path, {
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': file_sha256(csv_path),
+        'default_bytes': default_bytes,
+        # Where the snapshot's rows end, so loading it needs no scan of the csv
+        'rows': len(frame),
+        'offset': rows_end_offset(csv_path, len(frame)),
+    })
+
+
+def read_snapshot(arrow_path):
+    # split_blocks keeps each numeric column as a zero-copy view of the
+    # mapped pages, so processes reading the same snapshot share memory.
+    with pa.memory_map(arrow_path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def load_with_snapshot(name, parse):
+    """Load a csv from dados/ through its columnar snapshot, rebuilding it when stale.
+
+    `parse(path)` returns (frame, bytes with default dtypes). Without pyarrow
+    the csv is parsed directly.
+    """
+    csv_path = data_path(name)
+    if pa is None:
+        return parse(csv_path)
+    arrow_path, meta_path = snapshot_paths(name)
+    fresh, meta = snapshot_is_fresh(csv_path, meta_path)
+    if fresh and os.path.exists(arrow_path):
+        try:
+            return read_snapshot(arrow_path), meta['default_bytes']
+        except (OSError, pa.ArrowInvalid):
+            pass  # corrupt or truncated snapshot, rebuild below
+    frame, default_bytes = parse(csv_path)
+    try:
+        write_snapshot(frame, csv_path, arrow_path, meta_path, default_bytes)
+    except OSError:
+        pass  # read-only data dir: keep serving from the csv
+    return frame, default_bytes
+
+
+def read_lookups():
+    lookups = {}
+    for column, name in LOOKUP_FILES.items():
+        lookups[column], _ = load_with_snapshot(name, read_lookup)
+    return lookups
+
+
+def label_dictionaries(lookups):
+    return {column: LabelDictionary.from_lookup(lookup, column) for column, lookup in lookups.items()}
+
+
+@st.cache_resource(show_spinner="Carregando dados...")
+def load_dataset():
+    """Parse the csv files once per process; every session shares the result.
+
+    The frames are shared, so callers must treat them as read-only.
+    """
+    if config.INGEST_MODE == 'stream':
+        from stream import stream_dataset  # stream builds on this module
+        return stream_dataset()
+    timings = {}
+    start = time.perf_counter()
+    df, default_bytes = load_with_snapshot(SALES_FILE, read_sales)
+    lookups = read_lookups()
+    version = data_fingerprint()
+    timings['leitura dos dados'] = time.perf_counter() - start
+
+    compact_bytes = frame_bytes(df)
+    memory = {
+        'default_bytes': default_bytes,
+        'compact_bytes': compact_bytes,
+        'saved_bytes': default_bytes - compact_bytes,
+    }
+
+    start = time.perf_counter()
+    histograms = {column: build_histogram(df, column) for column in SKETCHED_COLUMNS}
+    trim = trim_bounds(histograms)
+    sketches = build_sketches(df, histograms)
+    timings['sketches de quantis'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cube = build_cube(df, trim)
+    timings['cubo'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = build_index(df)
+    cube_index = build_index(cube)
+    timings['índices'] = time.perf_counter() - start
+
+    return Dataset(
+        df=df,
+        lookups=lookups,
+        labels=label_dictionaries(lookups),
+        version=version,
+        fingerprint=version,
+        index=index,
+        cube=cube,
+        cube_index=cube_index,
+        sketches=sketches,
+        trim=trim,
+        memory=memory,
+        timings=timings,
+        source=sales_source(len(df)),
+    )
+
+
+def format_memory(memory):
+    mb = 1024 * 1024
+    if memory['saved_bytes'] < 0:
+        # Streamed aggregates have a fixed size and can exceed a small dataset
+        return (
+            f"{memory['compact_bytes'] / mb:,.1f} MB em memória "
+            f"(as linhas ocupariam {memory['default_bytes'] / mb:,.1f} MB)"
+        )
+    return (
+        f"{memory['compact_bytes'] / mb:,.1f} MB em memória "
+        f"(economia de {memory['saved_bytes'] / mb:,.1f} MB, "
+        f"{memory['saved_bytes'] / max(memory['default_bytes'], 1):.0%})"
+    )
@@ -0,0 +1,307 @@
+"""Concurrent load test of the dashboard: N simulated analysts on one server.
+
+    python loadtest.py [--sessions 1 2 4 8 16] [--steps 10] [--think 0]
+                       [--seed 0] [--output load.json]
+
+Starts `streamlit run main.py` on a free local port and speaks the
+browser's websocket protocol to it. Every simulated session opens the page,
+expands the lazy sections and then walks through its own sequence of
+filter changes (models, years, regions, transmission, reset), waiting
+--think seconds between them. The latency of a change is the time from
+sending the rerun to the server's script_finished, as the browser sees it.
+
+The levels in --sessions run one after another on the same server, so
+later levels find the caches the earlier ones filled, as a replica in
+service would. Each level reports p50/p95/p99 rerun latency, reruns per
+second and the server's RSS (peak while the level ran). Linux only, for
+/proc; the data is read from BMW_DATA_DIR as usual.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.asyncio.client import connect
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(ROOT, 'main.py')
+
+# Widget labels in main.py the sessions drive
+MODELS = 'Modelos de carros da BMW'
+REGIONS = 'Regiões'
+TRANSMISSIONS = 'Tipo de Transmissão'
+YEARS = 'Selecione o intervalo de anos:'
+LAZY_SECTIONS = (
+    'Mostrar análise de correlações', 'Mostrar análise de combustíveis',
+    'Mostrar análise de cores', 'Mostrar dados brutos',
+)
+SERVER_START_SECONDS = 120
+RSS_SAMPLE_SECONDS = 0.1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    env = dict(os.environ)
+    # Reruns must not be answered by results a previous run left on disk
+    env.setdefault('BMW_DISK_CACHE_MB', '0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP, '--server.headless', 'true',
+         '--server.port', str(port), '--server.address', '127.0.0.1',
+         '--browser.gatherUsageStats', 'false', '--server.fileWatcherType', 'none'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVER_START_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'o servidor terminou com status {server.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('o servidor não respondeu a tempo')
+
+
+def server_rss(pid):
+    """Resident memory of process `pid` in bytes."""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class Session:
+    """One browser tab: the widget states it sends and the widgets it has seen."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}  # label -> element proto (id, options, bounds)
+        self.states = {}  # widget id -> WidgetState
+        self.errors = 0
+
+    async def rerun(self):
+        """Send a full rerun with the current widget states; seconds until it finished."""
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = ''
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'delta':
+                self.read_delta(forward.delta)
+            elif kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.errors += 1
+                return time.perf_counter() - start
+
+    def read_delta(self, delta):
+        if delta.WhichOneof('type') == 'new_element':
+            element = getattr(delta.new_element, delta.new_element.WhichOneof('type'))
+            if delta.new_element.WhichOneof('type') == 'exception':
+                self.errors += 1
+            elif getattr(element, 'id', '') and getattr(element, 'label', ''):
+                self.widgets[element.label] = element
+        elif delta.WhichOneof('type') == 'add_block' and delta.add_block.WhichOneof('type') == 'expandable':
+            expandable = delta.add_block.expandable
+            if expandable.id:
+                self.widgets[expandable.label] = expandable
+
+    def state(self, label):
+        widget_id = self.widgets[label].id
+        return self.states.setdefault(widget_id, WidgetState(id=widget_id))
+
+    def choose(self, label, values):
+        state = self.state(label)
+        state.string_array_value.data[:] = list(values)
+
+    def options(self, label):
+        return list(self.widgets[label].options)
+
+    def years(self, low, high):
+        self.state(YEARS).double_array_value.data[:] = [low, high]
+
+    def year_bounds(self):
+        slider = self.widgets[YEARS]
+        return int(slider.min), int(slider.max)
+
+    def open_sections(self):
+        for label in LAZY_SECTIONS:
+            if label in self.widgets:
+                self.state(label).bool_value = True
+
+
+# Filter changes an analyst makes; each edits the session's widget states
+def pick_models(session, rng):
+    session.choose(MODELS, rng.sample(session.options(MODELS), rng.randint(1, 3)))
+
+
+def add_model(session, rng):
+    state = session.state(MODELS)
+    chosen = list(state.string_array_value.data)
+    missing = [model for model in session.options(MODELS) if model not in chosen]
+    if missing:
+        session.choose(MODELS, chosen + [rng.choice(missing)])
+
+
+def narrow_years(session, rng):
+    low, high = session.year_bounds()
+    start = rng.randint(low, high)
+    session.years(start, rng.randint(start, high))
+
+
+def pick_regions(session, rng):
+    regions = session.options(REGIONS)
+    session.choose(REGIONS, rng.sample(regions, rng.randint(1, len(regions))))
+
+
+def one_transmission(session, rng):
+    session.choose(TRANSMISSIONS, [rng.choice(session.options(TRANSMISSIONS))])
+
+
+def reset_filters(session, rng):
+    for label in (MODELS, REGIONS, TRANSMISSIONS):
+        session.choose(label, session.options(label))
+    session.years(*session.year_bounds())
+
+
+FILTER_CHANGES = (pick_models, add_model, narrow_years, pick_regions, one_transmission, reset_filters)
+
+
+async def simulate(url, steps, think, rng):
+    """Latencies of one session's filter changes (opening the page is not measured)."""
+    async with connect(url, max_size=None) as ws:
+        session = Session(ws)
+        await session.rerun()
+        session.open_sections()
+        await session.rerun()
+        latencies = []
+        for _ in range(steps):
+            if think:
+                await asyncio.sleep(think * rng.uniform(0.5, 1.5))
+            rng.choice(FILTER_CHANGES)(session, rng)
+            latencies.append(await session.rerun())
+        return latencies, session.errors
+
+
+async def sample_rss(pid, samples, done):
+    while not done.is_set():
+        samples.append(server_rss(pid))
+        await asyncio.sleep(RSS_SAMPLE_SECONDS)
+
+
+async def run_level(url, pid, sessions, steps, think, seed):
+    samples, done = [], asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(pid, samples, done))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        simulate(url, steps, think, random.Random(f'{seed}-{sessions}-{number}'))
+        for number in range(sessions)
+    ))
+    seconds = time.perf_counter() - start
+    done.set()
+    await sampler
+    latencies = np.array([latency for session_latencies, _ in results for latency in session_latencies])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'seconds': seconds,
+        'reruns_per_second': len(latencies) / seconds,
+        'p50_seconds': float(p50),
+        'p95_seconds': float(p95),
+        'p99_seconds': float(p99),
+        'max_seconds': float(latencies.max()) if len(latencies) else 0.0,
+        'peak_rss_bytes': max(samples, default=0),
+        'end_rss_bytes': server_rss(pid),
+    }
+
+
+async def run_load_test(port, pid, levels, steps, think, seed):
+    url = f'ws://127.0.0.1:{port}/_stcore/stream'
+    # The first session pays for the server's warm-up; it is not part of any level
+    start = time.perf_counter()
+    async with connect(url, max_size=None) as ws:
+        await Session(ws).rerun()
+    startup = time.perf_counter() - start
+    idle_rss = server_rss(pid)
+    results = [await run_level(url, pid, sessions, steps, think, seed) for sessions in levels]
+    return startup, idle_rss, results
+
+
+def summary(results):
+    lines = [f"inicialização: {results['startup_seconds']:.2f} s, RSS ocioso {results['idle_rss_bytes'] / 2**20:,.0f} MB"]
+    lines.append(f"{'sessões':>7} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'reruns/s':>9} {'RSS pico MB':>12} {'erros':>6}")
+    for level in results['levels']:
+        lines.append(
+            f"{level['sessions']:>7} {level['reruns']:>7} {level['p50_seconds'] * 1000:>8.0f} "
+            f"{level['p95_seconds'] * 1000:>8.0f} {level['p99_seconds'] * 1000:>8.0f} "
+            f"{level['reruns_per_second']:>9.1f} {level['peak_rss_bytes'] / 2**20:>12,.0f} {level['errors']:>6}"
+        )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='concurrent sessions of each level')
+    parser.add_argument('--steps', type=int, default=10, help='filter changes per session')
+    parser.add_argument('--think', type=float, default=0.0, help='mean seconds between changes (0 = back to back)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, help='server port (default: a free one)')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args(argv)
+
+    port = args.port or free_port()
+    server = start_server(port)
+    try:
+        startup, idle_rss, levels = asyncio.run(
+            run_load_test(port, server.pid, args.sessions, args.steps, args.think, args.seed)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'steps': args.steps,
+        'think_seconds': args.think,
+        'startup_seconds': startup,
+        'idle_rss_bytes': idle_rss,
+        'levels': levels,
+    }
+    print('\n'.join(summary(results)))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(level['errors'] for level in levels) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,6 +5,19 @@ import copy
 import json
 import numpy as np
 
+import config
+from boxplot import boxplot_chart, exact_box_stats
+from browser import raw_page
+from cache import result_cache
+from charts import chart_log, reset_chart_log, show_chart, show_table
+from filters import filter_state
+from loader import format_memory
+from payloads import Selection, payload_key, prefetch_payloads, reset_payload_log, section_payload
+from profiling import begin_rerun, end_rerun, profile_frame, profiled, profiled_fragment
+from refresh import current_dataset
+from scatter import downsampling_caption, price_mileage_chart
+from warmup import startup_warm_up
+
 st.markdown("""
     <style>
     .reportview-container {
@@ -17,8 +30,18 @@ st.markdown("""
     """, unsafe_allow_html=True
 )
 
-df = pd.read_csv('dados/df.csv')
-df_color = pd.read_csv('dados/df_color.csv')
+# Runs once per server process, in the first session's run: data, indexes
+# and the sections a fresh session draws
+startup_timings = startup_warm_up()
+reset_chart_log()
+reset_payload_log()
+dataset = current_dataset()
+df = dataset.df
+df_region = dataset.lookups['Region']
+df_transmission = dataset.lookups['Transmission']
+df_sales_classification = dataset.lookups['Sales_Classification']
+df_fuel_type = dataset.lookups['Fuel_Type']
+df_color = dataset.lookups['Color']
 
 st.set_page_config(
     page_title="BMW Estatísticas",
@@ -28,10 +51,27 @@ st.set_page_config(
 )
 
 
+st.sidebar.caption(f"💾 {format_memory(dataset.memory)}")
+if dataset.ingest:
+    st.sidebar.caption(
+        f"📥 {dataset.ingest['rows']:,} linhas agregadas em blocos "
+        f"({dataset.ingest['rows_per_second']:,.0f} linhas/s)"
+    )
+if dataset.refresh:
+    st.sidebar.caption(
+        f"🔄 +{dataset.refresh['rows']:,} linhas incorporadas "
+        f"em {dataset.refresh['seconds'] * 1000:.0f} ms"
+    )
+with st.sidebar.expander("⏱️ Aquecimento do servidor"):
+    st.dataframe(
+        pd.DataFrame({'Etapa': list(startup_timings), 'ms': [t * 1000 for t in startup_timings.values()]}).round(1),
+        hide_index=True,
+    )
 
 cols = st.columns(2)
 
-model_unicos = df['Model'].unique()
+# The cube holds every model and year, also when the rows were streamed
+model_unicos = dataset.cube['Model'].unique()
 
 def models_to_str(model):
     return ",".join(model_unicos)
@@ -47,9 +87,12 @@ if "model_input" not in st.session_state:
 top_left_cell = cols[0].container(
     border=True, height="stretch", vertical_alignment="center", width="stretch"
 )
+# In batch mode the widgets live in a form: edits are staged and applied in one rerun
+batch_filters = config.FILTER_APPLY_MODE == 'batch'
+filter_panel = top_left_cell.form("filters", border=False) if batch_filters else top_left_cell
 
 
-with top_left_cell:
+with filter_panel:
     models = st.multiselect(
         "Modelos de carros da BMW",
         options=sorted(set(model_unicos) | set(st.session_state.model_input)),
@@ -58,10 +101,9 @@ with top_left_cell:
         accept_new_options=True,
     )
 
-df_region = pd.read_csv('dados/df_region.csv')
 regions = np.sort(df_region["Region"].unique())
 
-with top_left_cell:
+with filter_panel:
     selected_regions = st.multiselect(
         "Regiões",
         options=regions,
@@ -69,9 +111,8 @@ with top_left_cell:
         placeholder="Escolha uma ou mais regiões para filtrar"
     )
 
-df_transmission = pd.read_csv('dados/df_transmission.csv')
 transmission_types = df_transmission['Transmission'].unique()
-with top_left_cell:
+with filter_panel:
     selected_transmissions = st.multiselect(
         "Tipo de Transmissão",
         options=transmission_types,
@@ -80,9 +121,8 @@ with top_left_cell:
     )
 
 
-df_sales_classification = pd.read_csv('dados/df_sales_classification.csv')
 sales_classifications = df_sales_classification['Sales_Classification'].unique()
-with top_left_cell:
+with filter_panel:
     selected_sales_classifications = st.multiselect(
         "Classificação de Vendas",
         options=sales_classifications,
@@ -91,7 +131,7 @@ with top_left_cell:
     )
 
     # Filtro de Anos com Slider de Intervalo
-    years_available = sorted(df['Year'].unique())
+    years_available = sorted(dataset.cube['Year'].unique())
     min_year, max_year = min(years_available), max(years_available)
     
     st.markdown("📅 **Período de Análise**")
@@ -104,41 +144,50 @@ with top_left_cell:
     )
     selected_years = list(range(year_range[0], year_range[1] + 1))
 
+    if batch_filters:
+        st.form_submit_button("Aplicar filtros", type="primary", width="stretch")
+
 
 #Right Cell
 right_cell = cols[1].container(
     border=True, height="stretch", vertical_alignment="center"
 )
 
-def calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications):
-       # Filter data for selected models
-    filtered_df = df[df['Model'].isin(models)].copy()
-        
-        # If regions are selected, filter by regions
-    if selected_regions:
-        region_ids = df_region[df_region['Region'].isin(selected_regions)]['Id'].tolist()
-        filtered_df = filtered_df[filtered_df['Region'].isin(region_ids)].copy()
-
-    if selected_transmissions:
-        transmission_ids = df_transmission[df_transmission['Transmission'].isin(selected_transmissions)]['Id'].tolist()
-        filtered_df = filtered_df[filtered_df['Transmission'].isin(transmission_ids)].copy()
-
-    if selected_sales_classifications:
-        sales_classification_ids = df_sales_classification[df_sales_classification['Sales_Classification'].isin(selected_sales_classifications)]['Id'].tolist()
-        filtered_df = filtered_df[filtered_df['Sales_Classification'].isin(sales_classification_ids)].copy()
-
-    if selected_years:
-        filtered_df = filtered_df[filtered_df['Year'].isin(selected_years)].copy()
-    return filtered_df
+# Filter once per rerun; sections read cached payloads of this selection.
+# Reruns that leave the canonical filters unchanged keep the previous selection
+# and the cells it already filtered; its rows live in the shared result cache.
+active_filters = filter_state(models, selected_regions, selected_transmissions, selected_sales_classifications, year_range)
+selection = st.session_state.get("selection")
+if selection is None or selection.state != active_filters or selection.dataset is not dataset:
+    selection = st.session_state["selection"] = Selection(dataset, active_filters)
+selected_rows = section_payload(selection, 'row_count')
+has_data = selected_rows > 0
+begin_rerun(selected_rows)
+
+# The sections below do not depend on each other; in thread mode their
+# payloads are computed together and each section waits for its own
+if models and has_data:
+    prefetch_payloads(selection, [
+        name for name, shown in (
+            ('region_metrics', selected_years),
+            ('regional_summary', selected_years),
+            ('correlation', st.session_state.get('open_correlation')),
+            ('fuel_analysis', st.session_state.get('open_fuel')),
+            ('color_metrics', st.session_state.get('open_color')),
+        ) if shown
+    ])
+
+cache_stats = result_cache().stats()
+st.sidebar.caption(
+    f"⚡ Cache: {cache_stats['hits']} acertos, {cache_stats['misses']} faltas, "
+    f"{cache_stats['bytes'] / (1024 * 1024):,.1f}/{cache_stats['max_bytes'] / (1024 * 1024):,.0f} MB"
+)
 
-with right_cell:
+with profiled('price_chart'), right_cell:
     if models:
-        filtered_df = df[df['Model'].isin(models)].copy()
-        # Filter data for selected models
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Group by Model and Year to get average price for better visualization
-            price_comparison = filtered_df.groupby(['Model', 'Year'])['Price_USD'].mean().reset_index()
+        if has_data:
+            # Average price by Model and Year for better visualization
+            price_comparison = section_payload(selection, 'price_comparison')
             
             # Create the chart
             chart = alt.Chart(price_comparison).mark_line(point=True).encode(
@@ -152,7 +201,7 @@ with right_cell:
                 width='container'
             )
             
-            st.altair_chart(chart, use_container_width=True)
+            show_chart('price_comparison', payload_key(selection, 'price_comparison'), chart, use_container_width=True)
         else:
             st.warning("Nenhum dado encontrado para os modelos selecionados.")
     else:
@@ -160,14 +209,12 @@ with right_cell:
 
 cols = st.columns(2)
 
-with cols[0]:
+with profiled('sales_bar'), cols[0]:
     st.subheader("Volume de vendas ao ano por modelo")
     if models:
-        filtered_df = df[df['Model'].isin(models)].copy()
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Group by Model and Year to get total sales volume for better visualization
-            sales_comparison = filtered_df.groupby(['Model', 'Year'])['Sales_Volume'].sum().reset_index()
+        if has_data:
+            # Total sales volume by Model and Year for better visualization
+            sales_comparison = section_payload(selection, 'sales_comparison')
          
             chart = alt.Chart(sales_comparison).mark_bar(point=True).encode(
                 x=alt.X('Year:O', title='Ano', axis=alt.Axis(labelAngle=0)),
@@ -180,29 +227,28 @@ with cols[0]:
                 width='container'
             )
             
-            st.altair_chart(chart, use_container_width=True)
+            show_chart('sales_comparison', payload_key(selection, 'sales_comparison'), chart, use_container_width=True)
         else:
             st.warning("Nenhum dado encontrado para os modelos selecionados.")
 
-with cols[1]:
+with profiled('boxplot'), cols[1]:
     st.subheader("Variação anual do preço médio por modelo")
     if models:
-        filtered_df = df[df['Model'].isin(models)].copy()
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
+        if has_data:
             
-            chart = alt.Chart(filtered_df).mark_boxplot(size=50).encode(
+            chart = boxplot_chart(
+                section_payload(selection, 'price_distribution'),
                 x=alt.X('Model:N', title='Modelo', axis=alt.Axis(labelAngle=-45)),
-                y=alt.Y('Price_USD:Q', title='Preço (USD)', scale=alt.Scale(zero=False)),
-                color=alt.Color('Model:N', scale=alt.Scale(scheme='category10'), legend=None),
-                tooltip=['Model:N', alt.Tooltip('Price_USD:Q', format=',.0f', title='Preço (USD)')]
+                y_title='Preço (USD)',
+                size=50,
+                color=alt.Color('Model:N', scale=alt.Scale(scheme='category10'), legend=None)
             ).properties(
                 title='Distribuição de Preços por Modelo (Boxplot)',
                 height=400,
                 width='container'
             )
 
-            st.altair_chart(chart, use_container_width=True)
+            show_chart('price_distribution', payload_key(selection, 'price_distribution'), chart, use_container_width=True)
         else:
             st.warning("Nenhum dado encontrado para os modelos selecionados.")
 
@@ -249,827 +295,713 @@ modelo_de_menor_faturamento = cols_terceira_linha[0].container(
 )
 
 
-with modelo_de_maior_preco:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate average price per model
-            avg_price = filtered_df.groupby('Model')['Price_USD'].mean().reset_index()
-            avg_price = avg_price.sort_values(by='Price_USD', ascending=False)
-            top_model = avg_price.iloc[0]
-            st.metric("🚗 Modelo de Maior Preço Médio", f"{top_model['Model']}", f"${top_model['Price_USD']:,.0f}"  )
+with profiled('kpi_cards'):
+    # One roll-up by Model and one by Year feed all the KPI cards
+    kpis = section_payload(selection, 'kpis') if models and has_data else None
 
+    with modelo_de_maior_preco:
+        if kpis:
+            model, price = kpis['highest_price']
+            st.metric("🚗 Modelo de Maior Preço Médio", f"{model}", f"${price:,.0f}")
 
-with modelo_de_menor_preco:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate average price per model
-            avg_price = filtered_df.groupby('Model')['Price_USD'].mean().reset_index()
-            avg_price = avg_price.sort_values(by='Price_USD', ascending=True)
-            top_model = avg_price.iloc[0]
-            st.metric("🚗 Modelo de Menor Preço Médio", f"{top_model['Model']}", f"${top_model['Price_USD']:,.0f}"  )
 
+    with modelo_de_menor_preco:
+        if kpis:
+            model, price = kpis['lowest_price']
+            st.metric("🚗 Modelo de Menor Preço Médio", f"{model}", f"${price:,.0f}")
 
-with modelo_de_maior_variancia_de_preco_por_ano:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate price variance per model
-            price_variance = filtered_df.groupby('Model')['Price_USD'].var().reset_index()
-            price_variance = price_variance.sort_values(by='Price_USD', ascending=False)
-            top_model = price_variance.iloc[0]
-            st.metric("🚗 Modelo de Maior Variância de Preço", f"{top_model['Model']}", f"${top_model['Price_USD']:,.0f}"  )
 
+    with modelo_de_maior_variancia_de_preco_por_ano:
+        if kpis:
+            model, variance = kpis['highest_variance']
+            st.metric("🚗 Modelo de Maior Variância de Preço", f"{model}", f"${variance:,.0f}")
 
-with modelo_de_menor_variancia_de_preco_por_ano:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate price variance per model
-            price_variance = filtered_df.groupby('Model')['Price_USD'].var().reset_index()
-            price_variance = price_variance.sort_values(by='Price_USD', ascending=True)
-            top_model = price_variance.iloc[0]
-            st.metric("🚗 Modelo de Menor Variância de Preço", f"{top_model['Model']}", f"${top_model['Price_USD']:,.0f}")
-
-with modelo_de_maior_participacao_de_mercado:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate market share per model
-            total_sales = filtered_df['Sales_Volume'].sum()
-            market_share = filtered_df.groupby('Model')['Sales_Volume'].sum().reset_index()
-            market_share['Market_Share'] = (market_share['Sales_Volume'] / total_sales) * 100
-            market_share = market_share.sort_values(by='Market_Share', ascending=False)
-            top_model = market_share.iloc[0]
-            st.metric("🚗 Modelo de Maior Participação de Mercado", f"{top_model['Model']}", f"{top_model['Market_Share']:.2f}%"
-        )
-
-with modelo_de_maior_faturamento:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate total revenue per model
-            filtered_df['Revenue'] = filtered_df['Price_USD'] * filtered_df['Sales_Volume']
-            revenue = filtered_df.groupby('Model')['Revenue'].sum().reset_index()
-            revenue = revenue.sort_values(by='Revenue', ascending=False)
-            top_model = revenue.iloc[0]
-            st.metric("🚗 Modelo de Maior Faturamentos De Acordo Com Os Filtros", f"{top_model['Model']}", f"${top_model['Revenue']:,.0f}"
-        )
-            
-with modelo_de_menor_faturamento:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate total revenue per model
-            filtered_df['Revenue'] = filtered_df['Price_USD'] * filtered_df['Sales_Volume']
-            revenue = filtered_df.groupby('Model')['Revenue'].sum().reset_index()
-            revenue = revenue.sort_values(by='Revenue', ascending=True)
-            top_model = revenue.iloc[0]
-            st.metric("🚗 Modelo de Menor Faturamento De Acordo Com Os Filtros", f"{top_model['Model']}", f"${top_model['Revenue']:,.0f}"
-        )
-
-#Só muda de acordo com o ano que eu puxo
-with ano_de_maior_faturamento:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            filtered_df['Revenue'] = filtered_df['Price_USD'] * filtered_df['Sales_Volume']
-            revenue_year = filtered_df.groupby('Year')['Revenue'].sum().reset_index()
-            revenue_year = revenue_year.sort_values(by='Revenue', ascending=False)
-            top_year = revenue_year.iloc[0]
-            st.metric("📅 Ano de Maior Faturamento", f"{top_year['Year']}", f"${top_year['Revenue']:,.0f}"
-        )
-            
 
-            
-with ano_de_menor_faturamento:
-    if models:
-        filtered_df = calcular_metricas(filtered_df, models, selected_regions, selected_transmissions, selected_sales_classifications)
-        if not filtered_df.empty:
-            # Calculate total revenue per year
-            filtered_df['Revenue'] = filtered_df['Price_USD'] * filtered_df['Sales_Volume']
-            revenue_year = filtered_df.groupby('Year')['Revenue'].sum().reset_index()
-            revenue_year = revenue_year.sort_values(by='Revenue', ascending=True)
-            top_year = revenue_year.iloc[0]
-            st.metric("📅 Ano de Menor Faturamento", f"{top_year['Year']}", f"${top_year['Revenue']:,.0f}"
-        )
+    with modelo_de_menor_variancia_de_preco_por_ano:
+        if kpis:
+            model, variance = kpis['lowest_variance']
+            st.metric("🚗 Modelo de Menor Variância de Preço", f"{model}", f"${variance:,.0f}")
+
+    with modelo_de_maior_participacao_de_mercado:
+        if kpis:
+            model, share = kpis['top_market_share']
+            st.metric("🚗 Modelo de Maior Participação de Mercado", f"{model}", f"{share:.2f}%")
+
+    with modelo_de_maior_faturamento:
+        if kpis:
+            model, revenue = kpis['highest_revenue']
+            st.metric("🚗 Modelo de Maior Faturamentos De Acordo Com Os Filtros", f"{model}", f"${revenue:,.0f}")
+
+    with modelo_de_menor_faturamento:
+        if kpis:
+            model, revenue = kpis['lowest_revenue']
+            st.metric("🚗 Modelo de Menor Faturamento De Acordo Com Os Filtros", f"{model}", f"${revenue:,.0f}")
+
+    #Só muda de acordo com o ano que eu puxo
+    with ano_de_maior_faturamento:
+        if kpis:
+            year, revenue = kpis['best_year']
+            st.metric("📅 Ano de Maior Faturamento", f"{year}", f"${revenue:,.0f}")
+
+    with ano_de_menor_faturamento:
+        if kpis:
+            year, revenue = kpis['worst_year']
+            st.metric("📅 Ano de Menor Faturamento", f"{year}", f"${revenue:,.0f}")
 
 # Análise de Volume de Vendas por Região
 st.subheader("📊 Volume de Vendas por Região")
+with profiled('region_volume'):
 
-if selected_years and models:
-    # Filter data based on selections
-    region_filtered_df = df[df['Model'].isin(models) & df['Year'].isin(selected_years)].copy()
-    
-    # If regions are selected, filter by regions
-    if selected_regions:
-        region_ids = df_region[df_region['Region'].isin(selected_regions)]['Id'].tolist()
-        region_filtered_df = region_filtered_df[region_filtered_df['Region'].isin(region_ids)].copy()
-
-    if selected_transmissions:
-        transmission_ids = df_transmission[df_transmission['Transmission'].isin(selected_transmissions)]['Id'].tolist()
-        region_filtered_df = region_filtered_df[region_filtered_df['Transmission'].isin(transmission_ids)].copy()
-    
-    if selected_sales_classifications:
-        sales_classification_ids = df_sales_classification[df_sales_classification['Sales_Classification'].isin(selected_sales_classifications)]['Id'].tolist()
-        region_filtered_df = region_filtered_df[region_filtered_df['Sales_Classification'].isin(sales_classification_ids)].copy()
-
-    if not region_filtered_df.empty:
-        region_data = region_filtered_df.merge(df_region, left_on='Region', right_on='Id', how='left')
-        
-        region_metrics = region_data.groupby('Region_y').agg({
-            'Sales_Volume': 'sum',
-            'Price_USD': 'mean'
-        }).reset_index()
-        region_metrics.columns = ['Região', 'Volume_Total', 'Preço_Médio']
-        region_metrics = region_metrics.sort_values('Volume_Total', ascending=False)
-        
-        col1, col2 = st.columns(2)
+    if selected_years and models:
+        if has_data:
+            region_metrics = section_payload(selection, 'region_metrics')
         
-        with col1:
-            volume_chart = alt.Chart(region_metrics).mark_bar().encode(
-                x=alt.X('Volume_Total:Q', title='Volume de Vendas'),
-                y=alt.Y('Região:N', sort='-x', title='Região'),
-                color=alt.Color('Volume_Total:Q', scale=alt.Scale(scheme='blues'), legend=None),
-                tooltip=['Região:N', alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume Total')]
-            ).properties(
-                title='Volume de Vendas por Região',
-                height=300
-            )
-            st.altair_chart(volume_chart, use_container_width=True)
+            col1, col2 = st.columns(2)
         
-        with col2:
-            st.write("**Resumo por Região:**")
-            region_metrics['Volume_Total'] = region_metrics['Volume_Total'].apply(lambda x: f"{x:,}")
-            region_metrics['Preço_Médio'] = region_metrics['Preço_Médio'].apply(lambda x: f"${x:,.0f}")
-            region_metrics.columns = ['Região', 'Volume Total', 'Preço Médio']
-            st.dataframe(region_metrics, hide_index=True)
+            with col1:
+                volume_chart = alt.Chart(region_metrics).mark_bar().encode(
+                    x=alt.X('Volume_Total:Q', title='Volume de Vendas'),
+                    y=alt.Y('Região:N', sort='-x', title='Região'),
+                    color=alt.Color('Volume_Total:Q', scale=alt.Scale(scheme='blues'), legend=None),
+                    tooltip=['Região:N', alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume Total')]
+                ).properties(
+                    title='Volume de Vendas por Região',
+                    height=300
+                )
+                show_chart('region_volume', payload_key(selection, 'region_metrics'), volume_chart, use_container_width=True)
+        
+            with col2:
+                st.write("**Resumo por Região:**")
+                region_metrics = region_metrics.copy()
+                region_metrics['Volume_Total'] = region_metrics['Volume_Total'].apply(lambda x: f"{x:,}")
+                region_metrics['Preço_Médio'] = region_metrics['Preço_Médio'].apply(lambda x: f"${x:,.0f}")
+                region_metrics.columns = ['Região', 'Volume Total', 'Preço Médio']
+                show_table(region_metrics, hide_index=True)
+        else:
+            st.warning("Nenhum dado encontrado para os modelos e anos selecionados.")
+    elif not selected_years:
+        st.info("Selecione pelo menos um ano para visualizar a análise por região.")
     else:
-        st.warning("Nenhum dado encontrado para os modelos e anos selecionados.")
-elif not selected_years:
-    st.info("Selecione pelo menos um ano para visualizar a análise por região.")
-else:
-    st.info("Selecione pelo menos um modelo para visualizar a análise por região.")
+        st.info("Selecione pelo menos um modelo para visualizar a análise por região.")
 
 # ===== INSIGHTS ESTRATÉGICOS REGIONAIS =====
 st.markdown("---")
 st.subheader("🎯 Insights Estratégicos Regionais")
+with profiled('regional_insights'):
+
+    if selected_years and models:
+        if has_data:
+            regional_summary = section_payload(selection, 'regional_summary')
+        
+            top_region = regional_summary.loc[regional_summary['Volume_Total'].idxmax()]
+            most_expensive_region = regional_summary.loc[regional_summary['Preço_Médio'].idxmax()]
+            most_diverse_region = regional_summary.loc[regional_summary['Qtd_Modelos'].idxmax()]
+        
+            insight_cols = st.columns(3)
+        
+            with insight_cols[0]:
+                st.success(f"""
+                **🏆 Região Líder em Volume:**
+                - **{top_region['Region']}**
+                - Volume: **{top_region['Volume_Total']:,.0f}** unidades
+                - Participação: **{top_region['Market_Share_%']:.1f}%**
+                - Oportunidade de expansão
+                """)
+        
+            with insight_cols[1]:
+                st.info(f"""
+                **💰 Região Premium:**
+                - **{most_expensive_region['Region']}**
+                - Preço médio: **${most_expensive_region['Preço_Médio']:,.0f}**
+                - Mercado de alto valor
+                - Potencial para modelos premium
+                """)
+        
+            with insight_cols[2]:
+                st.warning(f"""
+                **🌟 Região Mais Diversificada:**
+                - **{most_diverse_region['Region']}**
+                - Modelos ativos: **{most_diverse_region['Qtd_Modelos']:.0f}**
+                - Mercado maduro e receptivo
+                - Base para novos lançamentos
+                """)
+        
+            st.subheader("📊 Análise de Concentração de Mercado")
+        
+            col1, col2 = st.columns(2)
+        
+            with col1:
+                market_share_chart = alt.Chart(regional_summary).mark_arc(innerRadius=50).encode(
+                    theta=alt.Theta('Volume_Total:Q'),
+                    color=alt.Color('Region:N', scale=alt.Scale(scheme='category10'), title='Região'),
+                    tooltip=['Region:N', 
+                            alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume'),
+                            alt.Tooltip('Market_Share_%:Q', format='.1f', title='Participação (%)')]
+                ).properties(
+                    title='Distribuição de Market Share por Região',
+                    height=300
+                )
+                show_chart('region_market_share', payload_key(selection, 'regional_summary'), market_share_chart, use_container_width=True)
+        
+            with col2:
+                bubble_chart = alt.Chart(regional_summary).mark_circle(opacity=0.7).encode(
+                    x=alt.X('Preço_Médio:Q', title='Preço Médio (USD)'),
+                    y=alt.Y('Volume_Total:Q', title='Volume Total'),
+                    size=alt.Size('Market_Share_%:Q', scale=alt.Scale(range=[100, 800]), title='Market Share (%)'),
+                    color=alt.Color('Region:N', scale=alt.Scale(scheme='category10'), title='Região'),
+                    tooltip=['Region:N', 
+                            alt.Tooltip('Preço_Médio:Q', format=',.0f', title='Preço Médio'),
+                            alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume'),
+                            alt.Tooltip('Market_Share_%:Q', format='.1f', title='Market Share (%)')]
+                ).properties(
+                    title='Preço vs Volume por Região',
+                    height=300
+                )
+                show_chart('region_price_volume', payload_key(selection, 'regional_summary'), bubble_chart, use_container_width=True)
 
-if selected_years and models:
-    # Use the same filtered data from above
-    region_filtered_df = df[df['Model'].isin(models) & df['Year'].isin(selected_years)].copy()
-    
-    if selected_regions:
-        region_ids = df_region[df_region['Region'].isin(selected_regions)]['Id'].tolist()
-        region_filtered_df = region_filtered_df[region_filtered_df['Region'].isin(region_ids)].copy()
+# ===== ANÁLISE COMPLETA DE CORRELAÇÕES ENTRE VARIÁVEIS =====
+st.markdown("---")
+st.subheader("📊 Análise Completa de Correlações entre Variáveis")
 
-    if selected_transmissions:
-        transmission_ids = df_transmission[df_transmission['Transmission'].isin(selected_transmissions)]['Id'].tolist()
-        region_filtered_df = region_filtered_df[region_filtered_df['Transmission'].isin(transmission_ids)].copy()
-    
-    if selected_sales_classifications:
-        sales_classification_ids = df_sales_classification[df_sales_classification['Sales_Classification'].isin(selected_sales_classifications)]['Id'].tolist()
-        region_filtered_df = region_filtered_df[region_filtered_df['Sales_Classification'].isin(sales_classification_ids)].copy()
+@st.fragment
+@profiled_fragment('correlation')
+def correlation_section():
+    section = st.expander("Mostrar análise de correlações", key="open_correlation", on_change="rerun")
+    with section:
+        if not section.open:
+            return
+        if models:
+            correlation = section_payload(selection, 'correlation')
+            corr_data = correlation['corr_data']
+
+            # Rank methods need the rows themselves
+            if dataset.streamed:
+                method = 'Pearson'
+            else:
+                method = st.radio(
+                    "Método de correlação", ['Pearson', 'Spearman', 'Kendall'],
+                    horizontal=True, key="correlation_method"
+                )
+            matrix_source = 'correlation' if method == 'Pearson' else f'{method.lower()}_correlation'
+            ranked = None if method == 'Pearson' else section_payload(selection, matrix_source)
+            correlation_matrix = correlation['matrix'] if ranked is None else ranked['matrix']
+
+            if correlation_matrix is not None:
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.write(f"**📈 Matriz de Correlação de {method} - Heatmap**")
+                    corr_melted = correlation_matrix.reset_index().melt('index')
+                    corr_melted.columns = ['Variable_1', 'Variable_2', 'Correlation']
+
+                    heatmap = alt.Chart(corr_melted).mark_rect().encode(
+                        x=alt.X('Variable_1:O', title='Variáveis'),
+                        y=alt.Y('Variable_2:O', title='Variáveis'),
+                        color=alt.Color('Correlation:Q', scale=alt.Scale(scheme='redblue', domain=[-1, 1]), title='Correlação'),
+                        tooltip=['Variable_1:O', 'Variable_2:O', 'Correlation:Q']
+                    ).properties(
+                        title=f'Matriz de Correlação ({method})',
+                        width=350,
+                        height=350
+                    )
+
+                    text = alt.Chart(corr_melted).mark_text(baseline='middle', fontSize=10).encode(
+                        x=alt.X('Variable_1:O'),
+                        y=alt.Y('Variable_2:O'),
+                        text=alt.Text('Correlation:Q', format='.2f'),
+                        color=alt.condition(alt.datum.Correlation > 0.5, alt.value('white'), alt.value('black'))
+                    )
+
+                    show_chart('correlation_heatmap', payload_key(selection, matrix_source), heatmap + text, use_container_width=True)
+                    if ranked and ranked['error']:
+                        st.caption(
+                            f"Estimada em uma amostra de {ranked['used_rows']:,} de {ranked['rows']:,} linhas "
+                            f"(erro de até ±{ranked['error']:.3f} com 95% de confiança)."
+                        )
+                    if correlation['global_trim']:
+                        st.caption(
+                            "Ficam de fora as vendas abaixo do percentil 1% ou acima do 99% de preço ou "
+                            "quilometragem, com os limites calculados sobre todos os dados, não só a seleção."
+                        )
+
+                with col2:
+                    st.write("**🔍 Correlações Significativas (|r| ≥ 0.3)**")
+                    strong_correlations = []
+                    for i in range(len(correlation_matrix.columns)):
+                        for j in range(i+1, len(correlation_matrix.columns)):
+                            var1 = correlation_matrix.columns[i]
+                            var2 = correlation_matrix.columns[j]
+                            corr_value = correlation_matrix.iloc[i, j]
+                            if abs(corr_value) >= 0.3:
+                                strong_correlations.append({
+                                    'Variável 1': var1.replace('_', ' '),
+                                    'Variável 2': var2.replace('_', ' '),
+                                    'Correlação': corr_value,
+                                    'Força': 'Forte' if abs(corr_value) >= 0.7 else 'Moderada',
+                                    'Direção': 'Positiva' if corr_value > 0 else 'Negativa'
+                                })
+
+                    if strong_correlations:
+                        corr_df = pd.DataFrame(strong_correlations)
+                        corr_df = corr_df.sort_values('Correlação', key=abs, ascending=False)
+                        display_corr = corr_df.copy()
+                        display_corr['Correlação'] = display_corr['Correlação'].apply(lambda x: f"{x:.3f}")
+                        show_table(display_corr, width='stretch')
+
+                        st.write("**💡 Insights de Negócio:**")
+                        for _, row in corr_df.iterrows():
+                            var1 = row['Variável 1']
+                            var2 = row['Variável 2']
+                            corr = row['Correlação']
+                            if ('Mileage' in var1 or 'Mileage' in var2) and ('Price' in var1 or 'Price' in var2):
+                                if corr < 0:
+                                    st.warning(f"🚗 **Quilometragem vs Preço:** Carros com maior quilometragem tendem a valer menos ({corr:.3f})")
+                                else:
+                                    st.info(f"🚗 **Quilometragem vs Preço:** Relação positiva inesperada ({corr:.3f})")
+                            elif 'Price' in var1 or 'Price' in var2:
+                                if 'Engine' in var1 or 'Engine' in var2:
+                                    if corr > 0:
+                                        st.info(f"💰 **Preço vs Motor:** Motores maiores = preços mais altos ({corr:.3f})")
+                                elif 'Sales' in var1 or 'Sales' in var2:
+                                    if corr < 0:
+                                        st.warning(f"📉 **Preço vs Vendas:** Preços altos reduzem volume de vendas ({corr:.3f})")
+                                    else:
+                                        st.success(f"📈 **Preço vs Vendas:** Preços premium impulsionam vendas ({corr:.3f})")
+                            elif 'Engine' in var1 or 'Engine' in var2:
+                                if 'Sales' in var1 or 'Sales' in var2:
+                                    if corr > 0:
+                                        st.success(f"🔧 **Motor vs Vendas:** Motores potentes vendem mais ({corr:.3f})")
+                                    else:
+                                        st.warning(f"⚡ **Motor vs Vendas:** Preferência por motores menores ({corr:.3f})")
+
+                        st.write("**📊 Resumo Estatístico:**")
+                        avg_corr = np.mean([abs(c['Correlação']) for c in strong_correlations])
+                        max_corr = max([abs(c['Correlação']) for c in strong_correlations])
+                        st.metric("Correlação Média", f"{avg_corr:.3f}")
+                        st.metric("Correlação Máxima", f"{max_corr:.3f}")
+
+                        # Gráfico específico: Preço vs Quilometragem
+                        st.write("**📉 Relação Preço vs Quilometragem**")
+                        price_mileage = section_payload(selection, 'price_mileage')
+                        scatter = price_mileage_chart(price_mileage, opacity=0.6).properties(
+                            title='Preço vs Quilometragem',
+                            height=300
+                        )
+                        show_chart('price_mileage', payload_key(selection, 'price_mileage'), scatter, use_container_width=True)
+                        if downsampling_caption(price_mileage):
+                            st.caption(downsampling_caption(price_mileage))
+                    else:
+                        st.info("Nenhuma correlação significativa encontrada (|r| ≥ 0.3)")
+            else:
+                st.warning("Dados insuficientes para análise de correlação completa.")
+                st.markdown("---")
+                st.subheader("🔎 Prova de Ausência de Correlação entre Preço e Quilometragem")
+                if corr_data is not None and not corr_data.empty and 'Price_USD' in corr_data.columns and 'Mileage_KM' in corr_data.columns:
+                    corr_value = corr_data['Price_USD'].corr(corr_data['Mileage_KM'], method='pearson')
+                    st.write(f"**Coeficiente de correlação de Pearson entre Preço e Quilometragem:** `{corr_value:.3f}`")
+                    if abs(corr_value) < 0.3:
+                        st.success("Não existe correlação significativa entre preço e quilometragem dos carros BMW analisados (|r| < 0.3).")
+                    else:
+                        st.warning("Existe correlação significativa entre preço e quilometragem (|r| ≥ 0.3).")
+                    st.write("**Gráfico de dispersão com linha de tendência linear:**")
+                    price_mileage = section_payload(selection, 'price_mileage')
+                    trend_chart = price_mileage_chart(price_mileage, opacity=0.5, with_line=True)
+                    show_chart('price_mileage_trend', payload_key(selection, 'price_mileage'), trend_chart, use_container_width=True)
+                    if downsampling_caption(price_mileage):
+                        st.caption(downsampling_caption(price_mileage))
+                    st.caption("A linha de tendência é praticamente horizontal, reforçando a ausência de relação linear entre preço e quilometragem.")
+                    st.write("**Boxplot do preço por faixas de quilometragem:**")
+                    mileage_bands = corr_data.assign(Faixa_KM=pd.cut(corr_data['Mileage_KM'], bins=5).astype(str))
+                    boxplot = boxplot_chart(
+                        exact_box_stats(mileage_bands, 'Faixa_KM', 'Price_USD'),
+                        x=alt.X('Faixa_KM:N', title='Faixa de Quilometragem'),
+                        y_title='Preço (USD)',
+                        size=40
+                    ).properties(
+                        height=250
+                    )
+                    show_chart('price_by_mileage_band', payload_key(selection, 'correlation'), boxplot, use_container_width=True)
+                    st.caption("Os preços médios permanecem semelhantes entre as faixas de quilometragem, reforçando a ausência de correlação.")
+                else:
+                    st.info("Dados insuficientes para provar ausência de correlação entre preço e quilometragem.")
+
+correlation_section()
 
-    if not region_filtered_df.empty:
-        # Merge with region names for analysis
-        regional_analysis = region_filtered_df.merge(df_region, left_on='Region', right_on='Id', how='left')
-        
-        regional_summary = regional_analysis.groupby('Region_y').agg({
-            'Sales_Volume': ['sum', 'mean'],
-            'Price_USD': ['mean', 'std'],
-            'Model': 'nunique'
-        }).round(2)
-        
-        regional_summary.columns = ['Volume_Total', 'Volume_Médio', 'Preço_Médio', 'Desvio_Preço', 'Qtd_Modelos']
-        regional_summary = regional_summary.reset_index()
-        regional_summary['Market_Share_%'] = (regional_summary['Volume_Total'] / regional_summary['Volume_Total'].sum() * 100).round(1)
-        
-        top_region = regional_summary.loc[regional_summary['Volume_Total'].idxmax()]
-        most_expensive_region = regional_summary.loc[regional_summary['Preço_Médio'].idxmax()]
-        most_diverse_region = regional_summary.loc[regional_summary['Qtd_Modelos'].idxmax()]
-        
-        insight_cols = st.columns(3)
-        
-        with insight_cols[0]:
-            st.success(f"""
-            **🏆 Região Líder em Volume:**
-            - **{top_region['Region_y']}**
-            - Volume: **{top_region['Volume_Total']:,.0f}** unidades
-            - Participação: **{top_region['Market_Share_%']:.1f}%**
-            - Oportunidade de expansão
-            """)
-        
-        with insight_cols[1]:
-            st.info(f"""
-            **💰 Região Premium:**
-            - **{most_expensive_region['Region_y']}**
-            - Preço médio: **${most_expensive_region['Preço_Médio']:,.0f}**
-            - Mercado de alto valor
-            - Potencial para modelos premium
-            """)
-        
-        with insight_cols[2]:
-            st.warning(f"""
-            **🌟 Região Mais Diversificada:**
-            - **{most_diverse_region['Region_y']}**
-            - Modelos ativos: **{most_diverse_region['Qtd_Modelos']:.0f}**
-            - Mercado maduro e receptivo
-            - Base para novos lançamentos
-            """)
-        
-        st.subheader("📊 Análise de Concentração de Mercado")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            market_share_chart = alt.Chart(regional_summary).mark_arc(innerRadius=50).encode(
-                theta=alt.Theta('Volume_Total:Q'),
-                color=alt.Color('Region_y:N', scale=alt.Scale(scheme='category10'), title='Região'),
-                tooltip=['Region_y:N', 
-                        alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume'),
-                        alt.Tooltip('Market_Share_%:Q', format='.1f', title='Participação (%)')]
-            ).properties(
-                title='Distribuição de Market Share por Região',
-                height=300
-            )
-            st.altair_chart(market_share_chart, use_container_width=True)
-        
-        with col2:
-            bubble_chart = alt.Chart(regional_summary).mark_circle(opacity=0.7).encode(
-                x=alt.X('Preço_Médio:Q', title='Preço Médio (USD)'),
-                y=alt.Y('Volume_Total:Q', title='Volume Total'),
-                size=alt.Size('Market_Share_%:Q', scale=alt.Scale(range=[100, 800]), title='Market Share (%)'),
-                color=alt.Color('Region_y:N', scale=alt.Scale(scheme='category10'), title='Região'),
-                tooltip=['Region_y:N', 
-                        alt.Tooltip('Preço_Médio:Q', format=',.0f', title='Preço Médio'),
-                        alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume'),
-                        alt.Tooltip('Market_Share_%:Q', format='.1f', title='Market Share (%)')]
-            ).properties(
-                title='Preço vs Volume por Região',
-                height=300
-            )
-            st.altair_chart(bubble_chart, use_container_width=True)
+cols = st.columns(2)
 
-# ===== ANÁLISE COMPLETA DE CORRELAÇÕES ENTRE VARIÁVEIS =====
+# 🔋 COMPREHENSIVE FUEL TYPE ANALYSIS - CLIENT WOW SECTION
 st.markdown("---")
-st.subheader("📊 Análise Completa de Correlações entre Variáveis")
+st.header("🔋 Análise Estratégica: Evolução dos Combustíveis BMW")
 
-if models:
-    correlation_df = df[df['Model'].isin(models)].copy()
+@st.fragment
+@profiled_fragment('fuel')
+def fuel_section():
+    section = st.expander("Mostrar análise de combustíveis", key="open_fuel", on_change="rerun")
+    with section:
+        if not section.open:
+            return
+        if has_data:
+            # Comprehensive analysis with the applied filters
+            fuel_analysis = section_payload(selection, 'fuel_analysis')
+            fuel_metrics = fuel_analysis['metrics']
+            fuel_by_year = fuel_analysis['by_year']
+
+            st.subheader("📊 Métricas Principais por Tipo de Combustível")
+
+            # Display metrics in columns
+            metric_cols = st.columns(len(fuel_metrics))
+            for i, (_, row) in enumerate(fuel_metrics.iterrows()):
+                with metric_cols[i]:
+                    st.metric(
+                        label=f"🚗 {row['Tipo_Combustível']}", 
+                        value=f"{row['Volume_Total']:,.0f}",
+                        delta=f"${row['Preço_Médio']:,.0f} médio"
+                    )
+
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.subheader("📈 Evolução do Volume de Vendas")
+
+                sales_evolution = fuel_by_year[['Year', 'Fuel_Type', 'Sales_Volume']]
+
+                sales_chart = alt.Chart(sales_evolution).mark_line(point=True, strokeWidth=3).encode(
+                    x=alt.X('Year:O', title='Ano'),
+                    y=alt.Y('Sales_Volume:Q', title='Volume de Vendas'),
+                    color=alt.Color('Fuel_Type:N', 
+                                  title='Tipo de Combustível',
+                                  scale=alt.Scale(scheme='category10')),
+                    tooltip=['Year:O', 'Fuel_Type:N', alt.Tooltip('Sales_Volume:Q', format=',.0f', title='Volume')]
+                ).properties(
+                    title='Tendências de Vendas por Combustível',
+                    height=350
+                )
 
-    if selected_regions:
-        region_ids = df_region[df_region['Region'].isin(selected_regions)]['Id'].tolist()
-        correlation_df = correlation_df[correlation_df['Region'].isin(region_ids)].copy()
+                show_chart('fuel_sales', payload_key(selection, 'fuel_analysis'), sales_chart, use_container_width=True)
 
-    if selected_transmissions:
-        transmission_ids = df_transmission[df_transmission['Transmission'].isin(selected_transmissions)]['Id'].tolist()
-        correlation_df = correlation_df[correlation_df['Transmission'].isin(transmission_ids)].copy()
+                st.subheader("🥧 Participação de Mercado")
 
-    if selected_sales_classifications:
-        sales_classification_ids = df_sales_classification[df_sales_classification['Sales_Classification'].isin(selected_sales_classifications)]['Id'].tolist()
-        correlation_df = correlation_df[correlation_df['Sales_Classification'].isin(sales_classification_ids)].copy()
+                market_share = fuel_analysis['market_share']
 
-    if selected_years:
-        correlation_df = correlation_df[correlation_df['Year'].isin(selected_years)].copy()
+                pie_chart = alt.Chart(market_share).mark_arc(innerRadius=50).encode(
+                    theta=alt.Theta('Sales_Volume:Q'),
+                    color=alt.Color('Fuel_Type:N', 
+                                  title='Tipo de Combustível',
+                                  scale=alt.Scale(scheme='category10')),
+                    tooltip=['Fuel_Type:N', 
+                            alt.Tooltip('Sales_Volume:Q', format=',.0f', title='Volume'),
+                            alt.Tooltip('Percentage:Q', format='.1f', title='Participação (%)')]
+                ).properties(
+                    title='Distribuição do Volume de Vendas por Combustível',
+                    height=300
+                )
 
-    numeric_vars = ['Price_USD', 'Sales_Volume', 'Engine_Size_L', 'Mileage_KM', 'Year']
-    corr_data = correlation_df[numeric_vars].replace([np.inf, -np.inf], np.nan).dropna()
+                show_chart('fuel_market_share', payload_key(selection, 'fuel_analysis'), pie_chart, use_container_width=True)
 
-    for col in ['Mileage_KM', 'Price_USD']:
-        q_low = corr_data[col].quantile(0.01)
-        q_high = corr_data[col].quantile(0.99)
-        corr_data = corr_data[(corr_data[col] >= q_low) & (corr_data[col] <= q_high)]
+            with col2:
+                st.subheader("💰 Evolução dos Preços Médios")
 
-    if not corr_data.empty and len(corr_data) > 2:
-        # Pearson correlation
-        correlation_matrix = corr_data.corr(method='pearson')
+                price_evolution = fuel_by_year[['Year', 'Fuel_Type', 'Price_USD']]
 
-        col1, col2 = st.columns(2)
+                price_chart = alt.Chart(price_evolution).mark_line(point=True, strokeWidth=3).encode(
+                    x=alt.X('Year:O', title='Ano'),
+                    y=alt.Y('Price_USD:Q', title='Preço Médio (USD)', scale=alt.Scale(zero=False)),
+                    color=alt.Color('Fuel_Type:N', 
+                                  title='Tipo de Combustível',
+                                  scale=alt.Scale(scheme='category10')),
+                    tooltip=['Year:O', 'Fuel_Type:N', alt.Tooltip('Price_USD:Q', format=',.0f', title='Preço')]
+                ).properties(
+                    title='Evolução de Preços por Combustível',
+                    height=350
+                )
 
-        with col1:
-            st.write("**📈 Matriz de Correlação de Pearson - Heatmap**")
-            corr_melted = correlation_matrix.reset_index().melt('index')
-            corr_melted.columns = ['Variable_1', 'Variable_2', 'Correlation']
+                show_chart('fuel_prices', payload_key(selection, 'fuel_analysis'), price_chart, use_container_width=True)
 
-            heatmap = alt.Chart(corr_melted).mark_rect().encode(
-                x=alt.X('Variable_1:O', title='Variáveis'),
-                y=alt.Y('Variable_2:O', title='Variáveis'),
-                color=alt.Color('Correlation:Q', scale=alt.Scale(scheme='redblue', domain=[-1, 1]), title='Correlação'),
-                tooltip=['Variable_1:O', 'Variable_2:O', 'Correlation:Q']
-            ).properties(
-                title='Matriz de Correlação (Pearson)',
-                width=350,
-                height=350
-            )
+                st.subheader("📊 Preço vs Volume (Elasticidade)")
 
-            text = alt.Chart(corr_melted).mark_text(baseline='middle', fontSize=10).encode(
-                x=alt.X('Variable_1:O'),
-                y=alt.Y('Variable_2:O'),
-                text=alt.Text('Correlation:Q', format='.2f'),
-                color=alt.condition(alt.datum.Correlation > 0.5, alt.value('white'), alt.value('black'))
-            )
+                correlation_data = fuel_by_year[['Year', 'Fuel_Type', 'Price_USD', 'Sales_Volume']]
 
-            st.altair_chart(heatmap + text, use_container_width=True)
-
-        with col2:
-            st.write("**🔍 Correlações Significativas (|r| ≥ 0.3)**")
-            strong_correlations = []
-            for i in range(len(correlation_matrix.columns)):
-                for j in range(i+1, len(correlation_matrix.columns)):
-                    var1 = correlation_matrix.columns[i]
-                    var2 = correlation_matrix.columns[j]
-                    corr_value = correlation_matrix.iloc[i, j]
-                    if abs(corr_value) >= 0.3:
-                        strong_correlations.append({
-                            'Variável 1': var1.replace('_', ' '),
-                            'Variável 2': var2.replace('_', ' '),
-                            'Correlação': corr_value,
-                            'Força': 'Forte' if abs(corr_value) >= 0.7 else 'Moderada',
-                            'Direção': 'Positiva' if corr_value > 0 else 'Negativa'
-                        })
-
-            if strong_correlations:
-                corr_df = pd.DataFrame(strong_correlations)
-                corr_df = corr_df.sort_values('Correlação', key=abs, ascending=False)
-                display_corr = corr_df.copy()
-                display_corr['Correlação'] = display_corr['Correlação'].apply(lambda x: f"{x:.3f}")
-                st.dataframe(display_corr, width='stretch')
-
-                st.write("**💡 Insights de Negócio:**")
-                for _, row in corr_df.iterrows():
-                    var1 = row['Variável 1']
-                    var2 = row['Variável 2']
-                    corr = row['Correlação']
-                    if ('Mileage' in var1 or 'Mileage' in var2) and ('Price' in var1 or 'Price' in var2):
-                        if corr < 0:
-                            st.warning(f"🚗 **Quilometragem vs Preço:** Carros com maior quilometragem tendem a valer menos ({corr:.3f})")
-                        else:
-                            st.info(f"🚗 **Quilometragem vs Preço:** Relação positiva inesperada ({corr:.3f})")
-                    elif 'Price' in var1 or 'Price' in var2:
-                        if 'Engine' in var1 or 'Engine' in var2:
-                            if corr > 0:
-                                st.info(f"💰 **Preço vs Motor:** Motores maiores = preços mais altos ({corr:.3f})")
-                        elif 'Sales' in var1 or 'Sales' in var2:
-                            if corr < 0:
-                                st.warning(f"📉 **Preço vs Vendas:** Preços altos reduzem volume de vendas ({corr:.3f})")
-                            else:
-                                st.success(f"📈 **Preço vs Vendas:** Preços premium impulsionam vendas ({corr:.3f})")
-                    elif 'Engine' in var1 or 'Engine' in var2:
-                        if 'Sales' in var1 or 'Sales' in var2:
-                            if corr > 0:
-                                st.success(f"🔧 **Motor vs Vendas:** Motores potentes vendem mais ({corr:.3f})")
-                            else:
-                                st.warning(f"⚡ **Motor vs Vendas:** Preferência por motores menores ({corr:.3f})")
-
-                st.write("**📊 Resumo Estatístico:**")
-                avg_corr = np.mean([abs(c['Correlação']) for c in strong_correlations])
-                max_corr = max([abs(c['Correlação']) for c in strong_correlations])
-                st.metric("Correlação Média", f"{avg_corr:.3f}")
-                st.metric("Correlação Máxima", f"{max_corr:.3f}")
-
-                # Gráfico específico: Preço vs Quilometragem
-                st.write("**📉 Relação Preço vs Quilometragem**")
-                scatter = alt.Chart(corr_data).mark_circle(size=60, opacity=0.6).encode(
-                    x=alt.X('Mileage_KM:Q', title='Quilometragem (KM)'),
-                    y=alt.Y('Price_USD:Q', title='Preço (USD)', scale=alt.Scale(zero=False)),
-                    tooltip=[alt.Tooltip('Mileage_KM:Q', format=',.0f'), alt.Tooltip('Price_USD:Q', format=',.0f')]
+                scatter_chart = alt.Chart(correlation_data).mark_circle(size=100, opacity=0.7).encode(
+                    x=alt.X('Price_USD:Q', title='Preço Médio (USD)'),
+                    y=alt.Y('Sales_Volume:Q', title='Volume de Vendas'),
+                    color=alt.Color('Fuel_Type:N', 
+                                  title='Tipo de Combustível',
+                                  scale=alt.Scale(scheme='category10')),
+                    size=alt.value(150),
+                    tooltip=['Year:O', 'Fuel_Type:N', 
+                            alt.Tooltip('Price_USD:Q', format=',.0f', title='Preço'),
+                            alt.Tooltip('Sales_Volume:Q', format=',.0f', title='Volume')]
                 ).properties(
-                    title='Preço vs Quilometragem',
+                    title='Relação Preço-Volume por Combustível',
                     height=300
                 )
-                st.altair_chart(scatter, use_container_width=True)
-            else:
-                st.info("Nenhuma correlação significativa encontrada (|r| ≥ 0.3)")
-    else:
-        st.warning("Dados insuficientes para análise de correlação completa.")
-        st.markdown("---")
-        st.subheader("🔎 Prova de Ausência de Correlação entre Preço e Quilometragem")
-        if not corr_data.empty and 'Price_USD' in corr_data.columns and 'Mileage_KM' in corr_data.columns:
-            corr_value = corr_data['Price_USD'].corr(corr_data['Mileage_KM'], method='pearson')
-            st.write(f"**Coeficiente de correlação de Pearson entre Preço e Quilometragem:** `{corr_value:.3f}`")
-            if abs(corr_value) < 0.3:
-                st.success("Não existe correlação significativa entre preço e quilometragem dos carros BMW analisados (|r| < 0.3).")
-            else:
-                st.warning("Existe correlação significativa entre preço e quilometragem (|r| ≥ 0.3).")
-            st.write("**Gráfico de dispersão com linha de tendência linear:**")
-            scatter = alt.Chart(corr_data).mark_circle(size=60, opacity=0.5).encode(
-                x=alt.X('Mileage_KM:Q', title='Quilometragem (KM)'),
-                y=alt.Y('Price_USD:Q', title='Preço (USD)', scale=alt.Scale(zero=False)),
-                tooltip=[alt.Tooltip('Mileage_KM:Q', format=',.0f'), alt.Tooltip('Price_USD:Q', format=',.0f')]
-            )
-            regression = alt.Chart(corr_data).transform_regression(
-                'Mileage_KM', 'Price_USD'
-            ).mark_line(color='red', strokeDash=[5,5]).encode(
-                x='Mileage_KM:Q',
-                y='Price_USD:Q'
-            )
-            st.altair_chart(scatter + regression, use_container_width=True)
-            st.caption("A linha de tendência é praticamente horizontal, reforçando a ausência de relação linear entre preço e quilometragem.")
-            st.write("**Boxplot do preço por faixas de quilometragem:**")
-            corr_data['Faixa_KM'] = pd.cut(corr_data['Mileage_KM'], bins=5)
-            boxplot = alt.Chart(corr_data).mark_boxplot(size=40).encode(
-                x=alt.X('Faixa_KM:N', title='Faixa de Quilometragem'),
-                y=alt.Y('Price_USD:Q', title='Preço (USD)', scale=alt.Scale(zero=False)),
-                tooltip=[alt.Tooltip('Faixa_KM:N'), alt.Tooltip('Price_USD:Q', format=',.0f')]
-            ).properties(
-                height=250
-            )
-            st.altair_chart(boxplot, use_container_width=True)
-            st.caption("Os preços médios permanecem semelhantes entre as faixas de quilometragem, reforçando a ausência de correlação.")
-        else:
-            st.info("Dados insuficientes para provar ausência de correlação entre preço e quilometragem.")
-
-# Load fuel type data
-df_fuel_types = pd.read_csv('dados/df_fuel_type.csv')
-fuel_types_unicos = df_fuel_types['Fuel_Type'].unique()
 
-cols = st.columns(2)
+                show_chart('fuel_price_volume', payload_key(selection, 'fuel_analysis'), scatter_chart, use_container_width=True)
 
-# 🔋 COMPREHENSIVE FUEL TYPE ANALYSIS - CLIENT WOW SECTION
-st.markdown("---")
-st.header("🔋 Análise Estratégica: Evolução dos Combustíveis BMW")
+            st.markdown("---")
+            st.subheader("🎯 Insights Estratégicos")
 
-# Load fuel type data
-df_fuel_type = pd.read_csv('dados/df_fuel_type.csv')
+            growth_analysis = fuel_analysis['growth']
 
-# Create comprehensive analysis with applied filters
-analysis_df = df.copy()
+            insight_cols = st.columns(3)
 
-# Apply all selected filters to the analysis
-if models:
-    analysis_df = analysis_df[analysis_df['Model'].isin(models)].copy()
-if selected_regions:
-    region_ids = df_region[df_region['Region'].isin(selected_regions)]['Id'].tolist()
-    analysis_df = analysis_df[analysis_df['Region'].isin(region_ids)].copy()
-if selected_transmissions:
-    transmission_ids = df_transmission[df_transmission['Transmission'].isin(selected_transmissions)]['Id'].tolist()
-    analysis_df = analysis_df[analysis_df['Transmission'].isin(transmission_ids)].copy()
-if selected_sales_classifications:
-    sales_classification_ids = df_sales_classification[df_sales_classification['Sales_Classification'].isin(selected_sales_classifications)]['Id'].tolist()
-    analysis_df = analysis_df[analysis_df['Sales_Classification'].isin(sales_classification_ids)].copy()
-if selected_years:
-    analysis_df = analysis_df[analysis_df['Year'].isin(selected_years)].copy()
+            with insight_cols[0]:
+                st.info("📊 **Tendência de Mercado**\n\n" + 
+                        f"• Maior volume: **{market_share.loc[market_share['Sales_Volume'].idxmax(), 'Fuel_Type']}**\n" +
+                        f"• Participação: **{market_share['Percentage'].max():.1f}%**\n" +
+                        f"• Crescimento sustentável identificado")
 
+            with insight_cols[1]:
+                if not growth_analysis.empty and 'Sales_Volume' in growth_analysis.columns and len(growth_analysis) > 0:
+                    fastest_growing = growth_analysis['Sales_Volume'].idxmax()
+                    growth_rate = growth_analysis.loc[fastest_growing, 'Sales_Volume']
+                    st.success(f"🚀 **Crescimento Acelerado**\n\n" + 
+                              f"• **{fastest_growing}** lidera crescimento\n" +
+                              f"• Taxa: **{growth_rate:+.1f}%** vs ano anterior\n" +
+                              f"• Oportunidade estratégica")
+                else:
+                    st.info("🚀 **Crescimento Acelerado**\n\n• Dados insuficientes para análise\n• Expandir período de análise")
 
-fuel_analysis = analysis_df.merge(df_fuel_type, left_on='Fuel_Type', right_on='Id', how='left')
+            with insight_cols[2]:
+                avg_price = fuel_analysis['avg_price']
+                premium_fuels = fuel_analysis['premium_fuels']
+                st.warning("💎 **Segmento Premium**\n\n" + 
+                          f"• Preço médio: **${avg_price:,.0f}**\n" +
+                          f"• Combustíveis premium: **{len(premium_fuels)}**\n" +
+                          f"• Potencial de margem alta")
 
-if not fuel_analysis.empty:
-    st.subheader("📊 Métricas Principais por Tipo de Combustível")
-    
-    fuel_metrics = fuel_analysis.groupby('Fuel_Type_y').agg({
-        'Sales_Volume': 'sum',
-        'Price_USD': 'mean',
-        'Year': 'nunique'
-    }).round(0).reset_index()
-    fuel_metrics.columns = ['Tipo_Combustível', 'Volume_Total', 'Preço_Médio', 'Anos_Presentes']
-    
-    # Display metrics in columns
-    metric_cols = st.columns(len(fuel_metrics))
-    for i, (_, row) in enumerate(fuel_metrics.iterrows()):
-        with metric_cols[i]:
-            st.metric(
-                label=f"🚗 {row['Tipo_Combustível']}", 
-                value=f"{row['Volume_Total']:,.0f}",
-                delta=f"${row['Preço_Médio']:,.0f} médio"
-            )
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("📈 Evolução do Volume de Vendas")
-        
-        sales_evolution = fuel_analysis.groupby(['Year', 'Fuel_Type_y'])['Sales_Volume'].sum().reset_index()
-        
-        sales_chart = alt.Chart(sales_evolution).mark_line(point=True, strokeWidth=3).encode(
-            x=alt.X('Year:O', title='Ano'),
-            y=alt.Y('Sales_Volume:Q', title='Volume de Vendas'),
-            color=alt.Color('Fuel_Type_y:N', 
-                          title='Tipo de Combustível',
-                          scale=alt.Scale(scheme='category10')),
-            tooltip=['Year:O', 'Fuel_Type_y:N', alt.Tooltip('Sales_Volume:Q', format=',.0f', title='Volume')]
-        ).properties(
-            title='Tendências de Vendas por Combustível',
-            height=350
-        )
-        
-        st.altair_chart(sales_chart, use_container_width=True)
-        
-        st.subheader("🥧 Participação de Mercado")
-        
-        market_share = fuel_analysis.groupby('Fuel_Type_y')['Sales_Volume'].sum().reset_index()
-        market_share['Percentage'] = (market_share['Sales_Volume'] / market_share['Sales_Volume'].sum() * 100).round(1)
-        
-        pie_chart = alt.Chart(market_share).mark_arc(innerRadius=50).encode(
-            theta=alt.Theta('Sales_Volume:Q'),
-            color=alt.Color('Fuel_Type_y:N', 
-                          title='Tipo de Combustível',
-                          scale=alt.Scale(scheme='category10')),
-            tooltip=['Fuel_Type_y:N', 
-                    alt.Tooltip('Sales_Volume:Q', format=',.0f', title='Volume'),
-                    alt.Tooltip('Percentage:Q', format='.1f', title='Participação (%)')]
-        ).properties(
-            title='Distribuição do Volume de Vendas por Combustível',
-            height=300
-        )
-        
-        st.altair_chart(pie_chart, use_container_width=True)
-    
-    with col2:
-        st.subheader("💰 Evolução dos Preços Médios")
-        
-        price_evolution = fuel_analysis.groupby(['Year', 'Fuel_Type_y'])['Price_USD'].mean().reset_index()
-        
-        price_chart = alt.Chart(price_evolution).mark_line(point=True, strokeWidth=3).encode(
-            x=alt.X('Year:O', title='Ano'),
-            y=alt.Y('Price_USD:Q', title='Preço Médio (USD)', scale=alt.Scale(zero=False)),
-            color=alt.Color('Fuel_Type_y:N', 
-                          title='Tipo de Combustível',
-                          scale=alt.Scale(scheme='category10')),
-            tooltip=['Year:O', 'Fuel_Type_y:N', alt.Tooltip('Price_USD:Q', format=',.0f', title='Preço')]
-        ).properties(
-            title='Evolução de Preços por Combustível',
-            height=350
-        )
-        
-        st.altair_chart(price_chart, use_container_width=True)
-        
-        st.subheader("📊 Preço vs Volume (Elasticidade)")
-        
-        correlation_data = fuel_analysis.groupby(['Year', 'Fuel_Type_y']).agg({
-            'Price_USD': 'mean',
-            'Sales_Volume': 'sum'
-        }).reset_index()
-        
-        scatter_chart = alt.Chart(correlation_data).mark_circle(size=100, opacity=0.7).encode(
-            x=alt.X('Price_USD:Q', title='Preço Médio (USD)'),
-            y=alt.Y('Sales_Volume:Q', title='Volume de Vendas'),
-            color=alt.Color('Fuel_Type_y:N', 
-                          title='Tipo de Combustível',
-                          scale=alt.Scale(scheme='category10')),
-            size=alt.value(150),
-            tooltip=['Year:O', 'Fuel_Type_y:N', 
-                    alt.Tooltip('Price_USD:Q', format=',.0f', title='Preço'),
-                    alt.Tooltip('Sales_Volume:Q', format=',.0f', title='Volume')]
-        ).properties(
-            title='Relação Preço-Volume por Combustível',
-            height=300
-        )
-        
-        st.altair_chart(scatter_chart, use_container_width=True)
-    
-    st.markdown("---")
-    st.subheader("🎯 Insights Estratégicos")
-    
-    # Calculate insights
-    latest_year = fuel_analysis['Year'].max()
-    previous_year = latest_year - 1
-    
-    latest_data = fuel_analysis[fuel_analysis['Year'] == latest_year].groupby('Fuel_Type_y').agg({
-        'Sales_Volume': 'sum',
-        'Price_USD': 'mean'
-    })
-    
-    previous_data = fuel_analysis[fuel_analysis['Year'] == previous_year].groupby('Fuel_Type_y').agg({
-        'Sales_Volume': 'sum', 
-        'Price_USD': 'mean'
-    })
-    
-    if not previous_data.empty and not latest_data.empty:
-        growth_analysis = ((latest_data - previous_data) / previous_data * 100).round(1)
-    else:
-        growth_analysis = pd.DataFrame()
-    
-    insight_cols = st.columns(3)
-    
-    with insight_cols[0]:
-        st.info("📊 **Tendência de Mercado**\n\n" + 
-                f"• Maior volume: **{market_share.loc[market_share['Sales_Volume'].idxmax(), 'Fuel_Type_y']}**\n" +
-                f"• Participação: **{market_share['Percentage'].max():.1f}%**\n" +
-                f"• Crescimento sustentável identificado")
-    
-    with insight_cols[1]:
-        if not growth_analysis.empty and 'Sales_Volume' in growth_analysis.columns and len(growth_analysis) > 0:
-            fastest_growing = growth_analysis['Sales_Volume'].idxmax()
-            growth_rate = growth_analysis.loc[fastest_growing, 'Sales_Volume']
-            st.success(f"🚀 **Crescimento Acelerado**\n\n" + 
-                      f"• **{fastest_growing}** lidera crescimento\n" +
-                      f"• Taxa: **{growth_rate:+.1f}%** vs ano anterior\n" +
-                      f"• Oportunidade estratégica")
         else:
-            st.info("🚀 **Crescimento Acelerado**\n\n• Dados insuficientes para análise\n• Expandir período de análise")
-    
-    with insight_cols[2]:
-        avg_price = fuel_analysis['Price_USD'].mean()
-        premium_fuels = fuel_analysis[fuel_analysis['Price_USD'] > avg_price]['Fuel_Type_y'].unique()
-        st.warning("💎 **Segmento Premium**\n\n" + 
-                  f"• Preço médio: **${avg_price:,.0f}**\n" +
-                  f"• Combustíveis premium: **{len(premium_fuels)}**\n" +
-                  f"• Potencial de margem alta")
+            st.warning("⚠️ Nenhum dado disponível para a análise de combustível com os filtros selecionados.")
 
-else:
-    st.warning("⚠️ Nenhum dado disponível para a análise de combustível com os filtros selecionados.")
+fuel_section()
 
 # ===== ANÁLISE DETALHADA POR COR DE CARRO =====
 st.markdown("---")
 st.header("🎨 Análise Detalhada: Cores dos Veículos BMW")
 
-if models:
-    color_filtered_df = df[df['Model'].isin(models)].copy()
-    
-    if selected_regions:
-        region_ids = df_region[df_region['Region'].isin(selected_regions)]['Id'].tolist()
-        color_filtered_df = color_filtered_df[color_filtered_df['Region'].isin(region_ids)].copy()
-    
-    if selected_transmissions:
-        transmission_ids = df_transmission[df_transmission['Transmission'].isin(selected_transmissions)]['Id'].tolist()
-        color_filtered_df = color_filtered_df[color_filtered_df['Transmission'].isin(transmission_ids)].copy()
-    
-    if selected_sales_classifications:
-        sales_classification_ids = df_sales_classification[df_sales_classification['Sales_Classification'].isin(selected_sales_classifications)]['Id'].tolist()
-        color_filtered_df = color_filtered_df[color_filtered_df['Sales_Classification'].isin(sales_classification_ids)].copy()
-    
-    if selected_years:
-        color_filtered_df = color_filtered_df[color_filtered_df['Year'].isin(selected_years)].copy()
-    
-    # Merge with color data
-    color_analysis = color_filtered_df.merge(df_color, left_on='Color', right_on='Id', how='left')
-    
-    if not color_analysis.empty:
-        # Calculate comprehensive color metrics
-        color_metrics = color_analysis.groupby('Color_y').agg({
-            'Sales_Volume': ['sum', 'count'],
-            'Price_USD': ['mean', 'min', 'max']
-        }).round(2)
-        
-        # Flatten column names
-        color_metrics.columns = ['Volume_Total', 'Qtd_Vendas', 'Preço_Médio', 'Preço_Min', 'Preço_Max']
-        color_metrics = color_metrics.reset_index()
-        color_metrics['Participação_%'] = (color_metrics['Volume_Total'] / color_metrics['Volume_Total'].sum() * 100).round(1)
-        
-        # Calculate revenue
-        color_analysis['Revenue'] = color_analysis['Price_USD'] * color_analysis['Sales_Volume']
-        color_revenue = color_analysis.groupby('Color_y')['Revenue'].sum().reset_index()
-        color_metrics = color_metrics.merge(color_revenue, left_on='Color_y', right_on='Color_y', how='left')
-        
-        # Sort by volume
-        color_metrics = color_metrics.sort_values('Volume_Total', ascending=False)
-        
-        # Key insights section
-        st.subheader("🏆 Insights Principais - Cores")
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        # Most sold color
-        top_color = color_metrics.iloc[0]
-        with col1:
-            st.metric(
-                "🥇 Cor Mais Vendida",
-                top_color['Color_y'],
-                f"{top_color['Volume_Total']:,.0f} unidades"
-            )
-        
-        # Highest revenue color
-        highest_revenue_color = color_metrics.loc[color_metrics['Revenue'].idxmax()]
-        with col2:
-            st.metric(
-                "💰 Maior Faturamento",
-                highest_revenue_color['Color_y'],
-                f"${highest_revenue_color['Revenue']:,.0f}"
-            )
-        
-        # Most expensive color on average
-        most_expensive_color = color_metrics.loc[color_metrics['Preço_Médio'].idxmax()]
-        with col3:
-            st.metric(
-                "💎 Cor Premium",
-                most_expensive_color['Color_y'],
-                f"${most_expensive_color['Preço_Médio']:,.0f} médio"
-            )
-        
-        # Market leader percentage
-        leader_percentage = top_color['Participação_%']
-        with col4:
-            st.metric(
-                "📊 Dominância de Mercado",
-                f"{leader_percentage:.1f}%",
-                f"Liderança: {top_color['Color_y']}"
-            )
-        
-        st.subheader("📈 Análise Comparativa por Cor")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            volume_chart = alt.Chart(color_metrics).mark_bar().encode(
-                x=alt.X('Volume_Total:Q', title='Volume Total de Vendas'),
-                y=alt.Y('Color_y:N', sort='-x', title='Cor'),
-                color=alt.Color('Color_y:N', scale=alt.Scale(scheme='set1'), legend=None),
-                tooltip=[
-                    'Color_y:N',
-                    alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume'),
-                    alt.Tooltip('Participação_%:Q', format='.1f', title='Participação (%)')
-                ]
-            ).properties(
-                title='Volume de Vendas por Cor',
-                height=300
-            )
-            st.altair_chart(volume_chart, use_container_width=True)
-        
-        with col2:
-            price_chart = alt.Chart(color_metrics).mark_bar().encode(
-                x=alt.X('Preço_Médio:Q', title='Preço Médio (USD)'),
-                y=alt.Y('Color_y:N', sort='-x', title='Cor'),
-                color=alt.Color('Color_y:N', scale=alt.Scale(scheme='set1'), legend=None),
-                tooltip=[
-                    'Color_y:N',
-                    alt.Tooltip('Preço_Médio:Q', format=',.0f', title='Preço Médio'),
-                    alt.Tooltip('Preço_Min:Q', format=',.0f', title='Preço Mín'),
-                    alt.Tooltip('Preço_Max:Q', format=',.0f', title='Preço Máx')
+@st.fragment
+@profiled_fragment('color')
+def color_section():
+    section = st.expander("Mostrar análise de cores", key="open_color", on_change="rerun")
+    with section:
+        if not section.open:
+            return
+        if models:
+            if has_data:
+                # Comprehensive color metrics, sorted by volume
+                color_metrics = section_payload(selection, 'color_metrics')
+
+                # Key insights section
+                st.subheader("🏆 Insights Principais - Cores")
+
+                col1, col2, col3, col4 = st.columns(4)
+
+                # Most sold color
+                top_color = color_metrics.iloc[0]
+                with col1:
+                    st.metric(
+                        "🥇 Cor Mais Vendida",
+                        top_color['Color'],
+                        f"{top_color['Volume_Total']:,.0f} unidades"
+                    )
+
+                # Highest revenue color
+                highest_revenue_color = color_metrics.loc[color_metrics['Revenue'].idxmax()]
+                with col2:
+                    st.metric(
+                        "💰 Maior Faturamento",
+                        highest_revenue_color['Color'],
+                        f"${highest_revenue_color['Revenue']:,.0f}"
+                    )
+
+                # Most expensive color on average
+                most_expensive_color = color_metrics.loc[color_metrics['Preço_Médio'].idxmax()]
+                with col3:
+                    st.metric(
+                        "💎 Cor Premium",
+                        most_expensive_color['Color'],
+                        f"${most_expensive_color['Preço_Médio']:,.0f} médio"
+                    )
+
+                # Market leader percentage
+                leader_percentage = top_color['Participação_%']
+                with col4:
+                    st.metric(
+                        "📊 Dominância de Mercado",
+                        f"{leader_percentage:.1f}%",
+                        f"Liderança: {top_color['Color']}"
+                    )
+
+                st.subheader("📈 Análise Comparativa por Cor")
+
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    volume_chart = alt.Chart(color_metrics).mark_bar().encode(
+                        x=alt.X('Volume_Total:Q', title='Volume Total de Vendas'),
+                        y=alt.Y('Color:N', sort='-x', title='Cor'),
+                        color=alt.Color('Color:N', scale=alt.Scale(scheme='set1'), legend=None),
+                        tooltip=[
+                            'Color:N',
+                            alt.Tooltip('Volume_Total:Q', format=',.0f', title='Volume'),
+                            alt.Tooltip('Participação_%:Q', format='.1f', title='Participação (%)')
+                        ]
+                    ).properties(
+                        title='Volume de Vendas por Cor',
+                        height=300
+                    )
+                    show_chart('color_volume', payload_key(selection, 'color_metrics'), volume_chart, use_container_width=True)
+
+                with col2:
+                    price_chart = alt.Chart(color_metrics).mark_bar().encode(
+                        x=alt.X('Preço_Médio:Q', title='Preço Médio (USD)'),
+                        y=alt.Y('Color:N', sort='-x', title='Cor'),
+                        color=alt.Color('Color:N', scale=alt.Scale(scheme='set1'), legend=None),
+                        tooltip=[
+                            'Color:N',
+                            alt.Tooltip('Preço_Médio:Q', format=',.0f', title='Preço Médio'),
+                            alt.Tooltip('Preço_Min:Q', format=',.0f', title='Preço Mín'),
+                            alt.Tooltip('Preço_Max:Q', format=',.0f', title='Preço Máx')
+                        ]
+                    ).properties(
+                        title='Preço Médio por Cor',
+                        height=300
+                    )
+                    show_chart('color_prices', payload_key(selection, 'color_metrics'), price_chart, use_container_width=True)
+
+                st.subheader("📋 Tabela Detalhada por Cor")
+
+                display_color_metrics = color_metrics.copy()
+                display_color_metrics['Volume_Total'] = display_color_metrics['Volume_Total'].apply(lambda x: f"{x:,.0f}")
+                display_color_metrics['Preço_Médio'] = display_color_metrics['Preço_Médio'].apply(lambda x: f"${x:,.0f}")
+                display_color_metrics['Preço_Min'] = display_color_metrics['Preço_Min'].apply(lambda x: f"${x:,.0f}")
+                display_color_metrics['Preço_Max'] = display_color_metrics['Preço_Max'].apply(lambda x: f"${x:,.0f}")
+                display_color_metrics['Revenue'] = display_color_metrics['Revenue'].apply(lambda x: f"${x:,.0f}")
+
+                display_color_metrics.columns = [
+                    'Cor', 'Volume Total', 'Qtd Vendas', 'Preço Médio', 
+                    'Preço Mín', 'Preço Máx', 'Participação %', 'Faturamento'
                 ]
-            ).properties(
-                title='Preço Médio por Cor',
-                height=300
-            )
-            st.altair_chart(price_chart, use_container_width=True)
-        
-        st.subheader("📋 Tabela Detalhada por Cor")
-        
-        display_color_metrics = color_metrics.copy()
-        display_color_metrics['Volume_Total'] = display_color_metrics['Volume_Total'].apply(lambda x: f"{x:,.0f}")
-        display_color_metrics['Preço_Médio'] = display_color_metrics['Preço_Médio'].apply(lambda x: f"${x:,.0f}")
-        display_color_metrics['Preço_Min'] = display_color_metrics['Preço_Min'].apply(lambda x: f"${x:,.0f}")
-        display_color_metrics['Preço_Max'] = display_color_metrics['Preço_Max'].apply(lambda x: f"${x:,.0f}")
-        display_color_metrics['Revenue'] = display_color_metrics['Revenue'].apply(lambda x: f"${x:,.0f}")
-        
-        display_color_metrics.columns = [
-            'Cor', 'Volume Total', 'Qtd Vendas', 'Preço Médio', 
-            'Preço Mín', 'Preço Máx', 'Participação %', 'Faturamento'
-        ]
-        
-        st.dataframe(display_color_metrics, width='stretch')
-        
-        st.subheader("💡 Insights de Negócio")
-        
-        total_colors = len(color_metrics)
-        top_3_colors = color_metrics.head(3)
-        top_3_share = top_3_colors['Participação_%'].sum()
-        
-        insight_col1, insight_col2 = st.columns(2)
-        
-        with insight_col1:
-            st.info(f"""
-            **📊 Concentração de Mercado:**
-            - Total de cores disponíveis: **{total_colors}**
-            - Top 3 cores representam: **{top_3_share:.1f}%** do mercado
-            - Cor líder ({top_color['Color_y']}) domina **{leader_percentage:.1f}%**
-            """)
-            
-            price_range = most_expensive_color['Preço_Médio'] - color_metrics['Preço_Médio'].min()
-            st.success(f"""
-            **💰 Estratégia de Preços:**
-            - Diferença de preço entre cores: **${price_range:,.0f}**
-            - Cor premium: **{most_expensive_color['Color_y']}**
-            - Oportunidade de segmentação por cor
-            """)
-        
-        with insight_col2:
-            volume_leader = top_color['Color_y']
-            price_leader = most_expensive_color['Color_y']
-            
-            if volume_leader == price_leader:
-                correlation_insight = f"**{volume_leader}** lidera tanto em volume quanto em preço - cor premium dominante"
+
+                show_table(display_color_metrics, width='stretch')
+
+                st.subheader("💡 Insights de Negócio")
+
+                total_colors = len(color_metrics)
+                top_3_colors = color_metrics.head(3)
+                top_3_share = top_3_colors['Participação_%'].sum()
+
+                insight_col1, insight_col2 = st.columns(2)
+
+                with insight_col1:
+                    st.info(f"""
+                    **📊 Concentração de Mercado:**
+                    - Total de cores disponíveis: **{total_colors}**
+                    - Top 3 cores representam: **{top_3_share:.1f}%** do mercado
+                    - Cor líder ({top_color['Color']}) domina **{leader_percentage:.1f}%**
+                    """)
+
+                    price_range = most_expensive_color['Preço_Médio'] - color_metrics['Preço_Médio'].min()
+                    st.success(f"""
+                    **💰 Estratégia de Preços:**
+                    - Diferença de preço entre cores: **${price_range:,.0f}**
+                    - Cor premium: **{most_expensive_color['Color']}**
+                    - Oportunidade de segmentação por cor
+                    """)
+
+                with insight_col2:
+                    volume_leader = top_color['Color']
+                    price_leader = most_expensive_color['Color']
+
+                    if volume_leader == price_leader:
+                        correlation_insight = f"**{volume_leader}** lidera tanto em volume quanto em preço - cor premium dominante"
+                    else:
+                        correlation_insight = f"Mercado segmentado: **{volume_leader}** (volume) vs **{price_leader}** (premium)"
+
+                    st.warning(f"""
+                    **🎯 Posicionamento Estratégico:**
+                    - {correlation_insight}
+                    - Diversificação de portfólio por cor
+                    - Potencial de crescimento em cores premium
+                    """)
+
+                    least_sold_color = color_metrics.iloc[-1]['Color']
+                    st.error(f"""
+                    **⚠️ Atenção Estratégica:**
+                    - Cor com menor performance: **{least_sold_color}**
+                    - Revisar estratégia de marketing
+                    - Considerar descontinuação ou promoção
+                    """)
+
             else:
-                correlation_insight = f"Mercado segmentado: **{volume_leader}** (volume) vs **{price_leader}** (premium)"
-            
-            st.warning(f"""
-            **🎯 Posicionamento Estratégico:**
-            - {correlation_insight}
-            - Diversificação de portfólio por cor
-            - Potencial de crescimento em cores premium
-            """)
-            
-            least_sold_color = color_metrics.iloc[-1]['Color_y']
-            st.error(f"""
-            **⚠️ Atenção Estratégica:**
-            - Cor com menor performance: **{least_sold_color}**
-            - Revisar estratégia de marketing
-            - Considerar descontinuação ou promoção
-            """)
-    
-    else:
-        st.warning("⚠️ Nenhum dado de cor disponível com os filtros selecionados.")
-else:
-    st.info("👈 Selecione pelo menos um modelo na sidebar para visualizar a análise de cores.")
+                st.warning("⚠️ Nenhum dado de cor disponível com os filtros selecionados.")
+        else:
+            st.info("👈 Selecione pelo menos um modelo na sidebar para visualizar a análise de cores.")
+
+color_section()
 
 st.markdown("---")
 st.header("🎲 DATABASE CRUA")
-# Usando os outros arquivos csv para fazer o merge e mostrar os nomes ao invés do id
-df = df.merge(df_region, left_on='Region', right_on='Id', how='left', suffixes=('', '_region'))
-df = df.merge(df_transmission, left_on='Transmission', right_on='Id', how='left', suffixes=('', '_transmission'))
-df = df.merge(df_sales_classification, left_on='Sales_Classification', right_on='Id', how='left', suffixes=('', '_sales'))
-df = df.merge(df_color, left_on='Color', right_on='Id', how='left', suffixes=('', '_color'))
-df = df.merge(df_fuel_type, left_on='Fuel_Type', right_on='Id', how='left', suffixes=('', '_fuel'))
-
-st.dataframe(df, width='stretch')
+# Paginação, ordenação e projeção no servidor: só a página visível vai para o navegador
+@st.fragment
+@profiled_fragment('raw')
+def raw_section():
+    section = st.expander("Mostrar dados brutos", key="open_raw", on_change="rerun")
+    with section:
+        if not section.open:
+            return
+        if dataset.streamed:
+            st.info("Os dados brutos não ficam em memória no modo de ingestão em blocos (BMW_INGEST_MODE=stream).")
+            return
+        raw_rows = selection.rows
+        raw_columns = list(df.columns)
+
+        browser_cols = st.columns(4)
+        with browser_cols[0]:
+            visible_columns = st.multiselect("Colunas", options=raw_columns, default=raw_columns, key="raw_columns")
+        with browser_cols[1]:
+            sort_by = st.selectbox("Ordenar por", options=["(ordem original)"] + raw_columns, key="raw_sort_by")
+        with browser_cols[2]:
+            sort_order = st.radio("Ordem", options=["Crescente", "Decrescente"], horizontal=True, key="raw_sort_order")
+        with browser_cols[3]:
+            page_size = st.selectbox("Linhas por página", options=[25, 50, 100, 500], index=1, key="raw_page_size")
+
+        total_raw_rows = len(raw_rows)
+        page_count = max(1, -(-total_raw_rows // page_size))
+        # Filters may have shrunk the result below the page kept in the session
+        if st.session_state.get("raw_page", 1) > page_count:
+            st.session_state["raw_page"] = page_count
+        page = st.number_input(f"Página (de {page_count:,})", min_value=1, max_value=page_count, step=1, key="raw_page")
+
+        if visible_columns and total_raw_rows:
+            page_df = raw_page(
+                raw_rows,
+                dataset.labels,
+                visible_columns,
+                sort_by=None if sort_by == "(ordem original)" else sort_by,
+                ascending=sort_order == "Crescente",
+                page=page,
+                page_size=page_size,
+            )
+            first_row = (page - 1) * page_size + 1
+            st.caption(f"Linhas {first_row:,}–{first_row + len(page_df) - 1:,} de {total_raw_rows:,} com os filtros aplicados")
+            show_table(page_df, width='stretch')
+        elif not visible_columns:
+            st.info("Selecione pelo menos uma coluna para visualizar os dados.")
+        else:
+            st.warning("Nenhum dado encontrado com os filtros selecionados.")
+
+raw_section()
+
+with st.sidebar.expander("📦 Dados enviados aos gráficos"):
+    chart_bytes = chart_log()
+    st.caption(f"{len(chart_bytes)} gráficos, {sum(chart_bytes.values()) / 1024:,.1f} KB nesta execução")
+    st.dataframe(
+        pd.DataFrame({'Gráfico': list(chart_bytes), 'KB': [b / 1024 for b in chart_bytes.values()]}).round(1),
+        hide_index=True,
+    )
+
+if config.PROFILE_SIDEBAR:
+    with st.sidebar.expander("🐞 Perfil por seção", expanded=True):
+        st.dataframe(profile_frame(), hide_index=True)
+end_rerun()
@@ -0,0 +1,103 @@
+from itertools import combinations_with_replacement
+
+import numpy as np
+import pandas as pd
+
+# Numeric columns whose sums and cross products are kept per cube cell
+MOMENT_VARS = ['Price_USD', 'Sales_Volume', 'Engine_Size_L', 'Mileage_KM', 'Year']
+MOMENT_PAIRS = list(combinations_with_replacement(MOMENT_VARS, 2))
+# Only rows inside these quantiles of the whole dataset enter the co-moments,
+# counted apart from the cell's rows
+TRIMMED_COLUMNS = ('Mileage_KM', 'Price_USD')
+TRIM_QUANTILES = (0.01, 0.99)
+MOMENT_COUNT = 'moment_count'
+
+
+def sum_column(var):
+    return f'sum:{var}'
+
+
+def product_column(a, b):
+    return f'sum:{a}*{b}'
+
+
+MOMENT_COLUMNS = [
+    MOMENT_COUNT,
+    *[sum_column(v) for v in MOMENT_VARS],
+    *[product_column(a, b) for a, b in MOMENT_PAIRS],
+]
+
+
+def trim_mask(df, bounds):
+    """Rows of `df` with finite MOMENT_VARS, inside every (low, high) of `bounds`."""
+    keep = np.ones(len(df), dtype=bool)
+    for v in MOMENT_VARS:
+        keep &= np.isfinite(df[v].to_numpy(dtype=np.float64))
+    for column, (low, high) in bounds.items():
+        values = df[column].to_numpy()
+        keep &= (values >= low) & (values <= high)
+    return keep
+
+
+def own_trim(rows):
+    """`rows` with finite MOMENT_VARS, cut to their own TRIM_QUANTILES of each TRIMMED_COLUMNS in turn.
+
+    The per-selection trim of the original view: O(rows), for small selections.
+    """
+    rows = rows[np.isfinite(rows[MOMENT_VARS].to_numpy(dtype=np.float64)).all(axis=1)]
+    for column in TRIMMED_COLUMNS:
+        low, high = rows[column].quantile(TRIM_QUANTILES)
+        rows = rows[(rows[column] >= low) & (rows[column] <= high)]
+    return rows
+
+
+def row_moments(df, bounds=None):
+    """Per-row count, sums and cross products, as float64 arrays keyed by moment column.
+
+    Rows left out by trim_mask contribute zeros.
+    """
+    keep = trim_mask(df, bounds or {})
+    values = {v: np.where(keep, df[v].to_numpy(dtype=np.float64), 0.0) for v in MOMENT_VARS}
+    moments = {MOMENT_COUNT: keep.astype(np.float64)}
+    moments.update({sum_column(v): values[v] for v in MOMENT_VARS})
+    for a, b in MOMENT_PAIRS:
+        moments[product_column(a, b)] = values[a] * values[b]
+    return moments
+
+
+def covariance(cells):
+    """(n, sample covariance matrix) of MOMENT_VARS over the given cells."""
+    totals = cells[MOMENT_COLUMNS].sum()
+    n = float(totals[MOMENT_COUNT])
+    cov = pd.DataFrame(np.nan, index=MOMENT_VARS, columns=MOMENT_VARS)
+    if n < 2:
+        return n, cov
+    for a, b in MOMENT_PAIRS:
+        value = (totals[product_column(a, b)] - totals[sum_column(a)] * totals[sum_column(b)] / n) / (n - 1)
+        cov.loc[a, b] = cov.loc[b, a] = value
+    return n, cov
+
+
+def pearson_matrix(cells):
+    """Pearson correlation of MOMENT_VARS merged from the cells' co-moments (None with too few rows).
+
+    Summing the cells and normalising the 5x5 covariance costs O(cells).
+    """
+    n, cov = covariance(cells)
+    if n <= 2:
+        return None
+    std = np.sqrt(np.diag(cov.to_numpy()).clip(min=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov.to_numpy() / np.outer(std, std)
+    np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+    return pd.DataFrame(corr, index=MOMENT_VARS, columns=MOMENT_VARS)
+
+
+def regression(cells, x, y):
+    """(slope, intercept) of the least squares line of `y` on `x`, or None."""
+    totals = cells[[sum_column(x), sum_column(y)]].sum()
+    n, cov = covariance(cells)
+    if n < 2 or not cov.loc[x, x] > 0:
+        return None
+    slope = cov.loc[x, y] / cov.loc[x, x]
+    return slope, (totals[sum_column(y)] - slope * totals[sum_column(x)]) / n
@@ -0,0 +1,302 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+import time
+
+import pandas as pd
+import streamlit as st
+
+import config
+from boxplot import sketch_box_stats
+from cache import cached_result, result_cache
+from cube import attach_labels, rollup, rollup_with_labels
+from filters import apply_filters
+from kpis import compute_kpis
+from loader import with_models
+from moments import MOMENT_VARS, own_trim, pearson_matrix, regression, trim_mask
+from profiling import payload_rows, record
+from ranks import rank_correlation
+from scatter import X, Y, grid_price_mileage, price_mileage as scatter_payload
+
+NUMERIC_VARS = MOMENT_VARS
+
+
+class Selection:
+    """The dataset seen through one FilterState; rows and cells are filtered on first use.
+
+    A session keeps its Selection across reruns, so only the (small) cells
+    stay on it. The filtered rows go to the shared, byte-budgeted result
+    cache: a copy pinned per session would grow memory with sessions x rows.
+    """
+
+    def __init__(self, dataset, state):
+        self.dataset = dataset
+        self.state = state
+        # Payload key -> Future of the payloads prefetch_payloads() started
+        self.pending = {}
+
+    @property
+    def rows(self):
+        if self.dataset.streamed:
+            raise RuntimeError('rows are not kept when the data is streamed')
+        if self.cells is self.dataset.cube and not self.dataset.tails:
+            return self.dataset.df  # nothing filtered out: the shared frame itself
+        return result_cache().get_or_compute(('rows', self.dataset.version, self.state), self._filter_rows)
+
+    def _filter_rows(self):
+        dataset = self.dataset
+        parts = [apply_filters(df, dataset.lookups, self.state, index) for df, index in dataset.row_chunks()]
+        if len(parts) == 1:
+            return parts[0]
+        # Appended chunks may know models the loaded rows do not
+        dtype = dataset.cube['Model'].dtype
+        return pd.concat([with_models(part, dtype) for part in parts])
+
+    @cached_property
+    def cells(self):
+        return apply_filters(self.dataset.cube, self.dataset.lookups, self.state, self.dataset.cube_index)
+
+    def sketch(self, column):
+        """The quantile sketch of `column` and its selected (cell, bucket) counts."""
+        sketch = self.dataset.sketches[column]
+        return sketch, apply_filters(sketch.cells, self.dataset.lookups, self.state, sketch.index)
+
+
+def row_count(selection):
+    return int(selection.cells['count'].sum())
+
+
+def price_comparison(selection):
+    stats = rollup(selection.cells, ['Model', 'Year'])
+    return stats[['Model', 'Year', 'price_mean']].rename(columns={'price_mean': 'Price_USD'})
+
+
+def sales_comparison(selection):
+    stats = rollup(selection.cells, ['Model', 'Year'])
+    return stats[['Model', 'Year', 'volume_sum']].rename(columns={'volume_sum': 'Sales_Volume'})
+
+
+def kpis(selection):
+    return compute_kpis(selection.cells)
+
+
+def price_distribution(selection):
+    """Boxplot stats of the price per model."""
+    sketch, sketch_cells = selection.sketch('Price_USD')
+    stats = sketch_box_stats(sketch, sketch_cells, selection.cells, 'Model')
+    return stats.sort_values('Model', ignore_index=True)
+
+
+def region_metrics(selection):
+    stats = rollup_with_labels(selection.cells, 'Region', selection.dataset.labels['Region'])
+    stats = stats[['Region', 'volume_sum', 'price_mean']]
+    stats.columns = ['Região', 'Volume_Total', 'Preço_Médio']
+    return stats.sort_values('Volume_Total', ascending=False)
+
+
+def regional_summary(selection):
+    cells = selection.cells
+    summary = rollup(cells, ['Region'])
+    # Models present per region: number of (Region, Model) groups
+    summary['Qtd_Modelos'] = summary['Region'].map(rollup(cells, ['Region', 'Model']).groupby('Region').size())
+    summary = attach_labels(summary, 'Region', selection.dataset.labels['Region'])
+    summary = summary[
+        ['Region', 'volume_sum', 'volume_mean', 'price_mean', 'price_std', 'Qtd_Modelos']
+    ].round(2)
+    summary.columns = ['Region', 'Volume_Total', 'Volume_Médio', 'Preço_Médio', 'Desvio_Preço', 'Qtd_Modelos']
+    summary['Market_Share_%'] = (summary['Volume_Total'] / summary['Volume_Total'].sum() * 100).round(1)
+    return summary
+
+
+def own_trim_applies(selection):
+    """True when the selection is small enough to be trimmed to its own quantiles (EXACT_TRIM_ROWS)."""
+    return not selection.dataset.streamed and row_count(selection) <= config.EXACT_TRIM_ROWS
+
+
+def trimmed_rows(selection):
+    """Numeric columns of the selected rows that enter the correlations.
+
+    Small selections are cut to their own 1%/99% quantiles of Mileage and
+    Price, larger ones to the dataset-wide bounds (see Dataset.trim).
+    """
+    rows = selection.rows[NUMERIC_VARS]
+    if own_trim_applies(selection):
+        return own_trim(rows)
+    return rows[trim_mask(rows, selection.dataset.trim)]
+
+
+def correlation(selection):
+    """Pearson matrix of the trimmed selected rows (None with too few rows).
+
+    Large selections merge it from the co-moments of their cells, trimmed
+    at the dataset-wide 1% and 99% quantiles of Mileage and Price; small
+    ones correlate their own trimmed rows. Without a matrix, the few rows
+    left are returned as corr_data for the fallback view (None when the
+    data was streamed).
+    """
+    own = own_trim_applies(selection)
+    corr_data = None
+    if own:
+        corr_data = trimmed_rows(selection)
+        matrix = corr_data.corr(method='pearson') if len(corr_data) > 2 else None
+    else:
+        matrix = pearson_matrix(selection.cells)
+        if matrix is None and not selection.dataset.streamed:
+            corr_data = trimmed_rows(selection)
+    if matrix is not None:
+        corr_data = None
+    return {'corr_data': corr_data, 'matrix': matrix, 'global_trim': not own}
+
+
+def spearman_correlation(selection):
+    """Spearman matrix of the same rows as correlation(); needs resident rows."""
+    return rank_correlation(trimmed_rows(selection), 'spearman', config.RANK_MAX_ERROR)
+
+
+def kendall_correlation(selection):
+    """Kendall tau-b matrix of the same rows as correlation(); needs resident rows."""
+    return rank_correlation(trimmed_rows(selection), 'kendall', config.RANK_MAX_ERROR)
+
+
+def price_mileage(selection):
+    if selection.dataset.streamed:
+        grid = selection.dataset.scatter_grid
+        counts = apply_filters(grid.cells, selection.dataset.lookups, selection.state, grid.index)
+        return grid_price_mileage(grid, counts, regression(selection.cells, X, Y))
+    return scatter_payload(trimmed_rows(selection), config.SCATTER_MAX_POINTS, config.SCATTER_MODE, config.SCATTER_BINS)
+
+
+def fuel_analysis(selection):
+    cells = selection.cells
+    labels = selection.dataset.labels['Fuel_Type']
+    summary = rollup_with_labels(cells, 'Fuel_Type', labels)
+    by_year = rollup_with_labels(cells, 'Fuel_Type', labels, extra=['Year'])
+    by_year = by_year.rename(columns={'volume_sum': 'Sales_Volume', 'price_mean': 'Price_USD'})
+
+    metrics = summary[['Fuel_Type', 'volume_sum', 'price_mean']].copy()
+    metrics['Anos_Presentes'] = metrics['Fuel_Type'].map(by_year.groupby('Fuel_Type', observed=True).size()).astype('int64')
+    metrics = metrics.round(0)
+    metrics.columns = ['Tipo_Combustível', 'Volume_Total', 'Preço_Médio', 'Anos_Presentes']
+
+    market_share = summary[['Fuel_Type', 'volume_sum']].rename(columns={'volume_sum': 'Sales_Volume'})
+    market_share['Percentage'] = (market_share['Sales_Volume'] / market_share['Sales_Volume'].sum() * 100).round(1)
+
+    # Year over year growth of the latest year in the selection
+    latest_year = cells['Year'].max()
+    yearly = by_year.set_index('Fuel_Type')[['Year', 'Sales_Volume', 'Price_USD']]
+    latest_data = yearly[yearly['Year'] == latest_year].drop(columns='Year')
+    previous_data = yearly[yearly['Year'] == latest_year - 1].drop(columns='Year')
+    if not previous_data.empty and not latest_data.empty:
+        growth = ((latest_data - previous_data) / previous_data * 100).round(1)
+    else:
+        growth = pd.DataFrame()
+
+    avg_price = cells['price_sum'].sum() / cells['count'].sum()
+    # A fuel is premium when any of its sales is above the overall mean
+    premium_fuels = summary.loc[summary['price_max'] > avg_price, 'Fuel_Type'].unique()
+
+    return {
+        'metrics': metrics,
+        'by_year': by_year,
+        'market_share': market_share,
+        'growth': growth,
+        'avg_price': avg_price,
+        'premium_fuels': premium_fuels,
+    }
+
+
+def color_metrics(selection):
+    summary = rollup_with_labels(selection.cells, 'Color', selection.dataset.labels['Color'])
+    metrics = summary[['Color', 'volume_sum', 'count', 'price_mean', 'price_min', 'price_max']].round(2)
+    metrics.columns = ['Color', 'Volume_Total', 'Qtd_Vendas', 'Preço_Médio', 'Preço_Min', 'Preço_Max']
+    metrics['Participação_%'] = (metrics['Volume_Total'] / metrics['Volume_Total'].sum() * 100).round(1)
+    metrics['Revenue'] = summary['revenue_sum']
+    return metrics.sort_values('Volume_Total', ascending=False)
+
+
+SECTIONS = {
+    'row_count': row_count,
+    'price_comparison': price_comparison,
+    'sales_comparison': sales_comparison,
+    'kpis': kpis,
+    'price_distribution': price_distribution,
+    'region_metrics': region_metrics,
+    'regional_summary': regional_summary,
+    'correlation': correlation,
+    'spearman_correlation': spearman_correlation,
+    'kendall_correlation': kendall_correlation,
+    'price_mileage': price_mileage,
+    'fuel_analysis': fuel_analysis,
+    'color_metrics': color_metrics,
+}
+
+# Only computed when picked in the correlation section, so left out of the warm-up
+OPTIONAL_SECTIONS = ('spearman_correlation', 'kendall_correlation')
+
+# Deployment settings a section depends on, part of its cache key
+SECTION_SETTINGS = {
+    'correlation': config.EXACT_TRIM_ROWS,
+    'spearman_correlation': (config.RANK_MAX_ERROR, config.EXACT_TRIM_ROWS),
+    'kendall_correlation': (config.RANK_MAX_ERROR, config.EXACT_TRIM_ROWS),
+    'price_mileage': (config.SCATTER_MAX_POINTS, config.SCATTER_MODE, config.SCATTER_BINS, config.EXACT_TRIM_ROWS),
+}
+
+
+def payload_key(selection, name):
+    """Cache key of the payload of section `name`; equal keys mean equal payloads."""
+    return (name, selection.dataset.version, selection.state, SECTION_SETTINGS.get(name))
+
+
+def reset_payload_log():
+    st.session_state['payload_seconds'] = {}
+
+
+def payload_log():
+    """Section name -> seconds spent getting its payload in the current run, cache hits included."""
+    return st.session_state.setdefault('payload_seconds', {})
+
+
+def compute_payload(selection, name):
+    """Payload of section `name` through the result caches; touches no session state."""
+    key = payload_key(selection, name)
+    # The disk cache stays in the load fingerprint's directory; the version in the key tells appends apart
+    return cached_result(key, selection.dataset.fingerprint, lambda: SECTIONS[name](selection))
+
+
+@st.cache_resource
+def section_executor():
+    """Thread pool shared by every session for prefetch_payloads()."""
+    return ThreadPoolExecutor(config.SECTION_WORKERS, thread_name_prefix='section')
+
+
+def prefetch_payloads(selection, names):
+    """Start computing the payloads of `names` together (BMW_SECTION_EXECUTOR=thread).
+
+    The payloads run in the section pool while the script renders what
+    comes before them; section_payload() then waits for each one where its
+    section renders, so the page still renders in order. The rollups only
+    overlap while pandas and NumPy kernels release the GIL, so the gain
+    depends on the free cores. A no-op in serial mode.
+    """
+    if config.SECTION_EXECUTOR != 'thread':
+        return
+    # Filter once here rather than in every worker
+    selection.cells
+    pool = section_executor()
+    for name in names:
+        key = payload_key(selection, name)
+        if key not in selection.pending:
+            selection.pending[key] = pool.submit(compute_payload, selection, name)
+
+
+def section_payload(selection, name):
+    """Payload of section `name`, shared across sessions and restarts through the result caches.
+
+    Payloads are shared: callers must copy before modifying them.
+    """
+    start = time.perf_counter()
+    future = selection.pending.pop(payload_key(selection, name), None)
+    payload = future.result() if future else compute_payload(selection, name)
+    log = payload_log()
+    log[name] = log.get(name, 0.0) + time.perf_counter() - start
+    record(rows_out=payload_rows(payload))
+    return payload
@@ -0,0 +1,151 @@
+"""Per-section profile of every rerun: wall time, rows in and out, chart bytes, memory.
+
+main.py wraps each logical section in `profiled(name)`. While a section
+is open, section_payload() reports the rows of the payloads it hands out,
+show_chart() the bytes it sends and show_table() the rows and bytes of a
+table, so the sections themselves stay untouched.
+Rows in are the rows of the active selection. The memory delta is the change
+in the process RSS, so it is only meaningful while one session is busy.
+
+The profile of a rerun lives in session_state (shown in the sidebar with
+BMW_PROFILE_SIDEBAR=1) and, with BMW_PROFILE_LOG set, is appended to that
+file as one JSON object per line. A fragment rerunning alone gets a record
+of its own section.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+import config
+
+_log_lock = threading.Lock()
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """Resident memory of the process in bytes, or None where /proc is missing."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def payload_rows(payload):
+    """Rows in a section payload: frames count their rows, containers their members."""
+    if isinstance(payload, (pd.DataFrame, pd.Series)):
+        return len(payload)
+    if isinstance(payload, dict):
+        return sum(payload_rows(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(payload_rows(value) for value in payload)
+    return 0 if payload is None else 1
+
+
+def begin_rerun(rows_in):
+    """Start the profile of a full rerun over a selection of `rows_in` rows."""
+    st.session_state['section_profile'] = {}
+    st.session_state['profile_rows_in'] = rows_in
+    st.session_state['profile_started'] = time.time()
+    st.session_state['profile_open'] = True
+
+
+def profile_log():
+    """Section name -> measurements of the current rerun."""
+    return st.session_state.setdefault('section_profile', {})
+
+
+def _open_sections():
+    return st.session_state.setdefault('profiled_sections', [])
+
+
+def record(rows_out=0, chart_bytes=0):
+    """Add to the innermost section being profiled; a no-op outside sections."""
+    sections = _open_sections()
+    if sections:
+        sections[-1]['rows_out'] += rows_out
+        sections[-1]['chart_bytes'] += chart_bytes
+        sections[-1]['charts'] += bool(chart_bytes)
+
+
+@contextmanager
+def profiled(name):
+    entry = {
+        'seconds': 0.0,
+        'rows_in': st.session_state.get('profile_rows_in'),
+        'rows_out': 0,
+        'charts': 0,
+        'chart_bytes': 0,
+        'memory_delta_bytes': None,
+    }
+    sections = _open_sections()
+    sections.append(entry)
+    rss = current_rss()
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry['seconds'] = time.perf_counter() - start
+        if rss is not None:
+            entry['memory_delta_bytes'] = current_rss() - rss
+        sections.remove(entry)
+        profile_log()[name] = entry
+
+
+def profiled_fragment(name):
+    """Profile a fragment's body; when it reruns alone, log that rerun by itself."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            alone = not st.session_state.get('profile_open')
+            if alone:
+                st.session_state['section_profile'] = {}
+                st.session_state['profile_started'] = time.time()
+            with profiled(name):
+                result = function(*args, **kwargs)
+            if alone:
+                write_log('fragment')
+            return result
+        return wrapper
+    return decorate
+
+
+def end_rerun():
+    st.session_state['profile_open'] = False
+    write_log('full')
+
+
+def write_log(kind):
+    """Append the current profile to BMW_PROFILE_LOG as one JSON line."""
+    if not config.PROFILE_LOG:
+        return
+    line = json.dumps({
+        'time': st.session_state.get('profile_started'),
+        'kind': kind,
+        'rows_in': st.session_state.get('profile_rows_in'),
+        'sections': profile_log(),
+    })
+    with _log_lock, open(config.PROFILE_LOG, 'a') as f:
+        f.write(line + '\n')
+
+
+def profile_frame():
+    """The current profile as a table for the debug sidebar."""
+    log = profile_log()
+    return pd.DataFrame({
+        'Seção': list(log),
+        'ms': [entry['seconds'] * 1000 for entry in log.values()],
+        'Linhas (entrada)': [entry['rows_in'] for entry in log.values()],
+        'Linhas (saída)': [entry['rows_out'] for entry in log.values()],
+        'KB gráficos': [entry['chart_bytes'] / 1024 for entry in log.values()],
+        'Δ memória (MB)': [
+            None if entry['memory_delta_bytes'] is None else entry['memory_delta_bytes'] / 2**20
+            for entry in log.values()
+        ],
+    }).round(1)
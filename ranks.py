@@ -0,0 +1,157 @@
+"""Rank correlations (Spearman, Kendall tau-b) of every column pair.
+
+Ties are handled as pandas does: average ranks for Spearman, tau-b for
+Kendall. Spearman ranks every column once and correlates them in a single
+matrix product. Kendall follows Knight: once the rows are sorted by one
+column, the discordant pairs are the inversions of the other, counted in
+O(n log n) without a Python loop over the rows.
+"""
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+# Two-sided 95% normal quantile
+Z_95 = 1.959963984540054
+# Variance of Fisher's z of each coefficient, about c / (n - d) (Fieller, Hartley and Pearson, 1957)
+FISHER_VARIANCE = {'spearman': (1.06, 3), 'kendall': (0.437, 4)}
+
+
+def average_ranks(values):
+    """Ranks 1..n of every column of `values`, tied values sharing their average rank."""
+    n, k = values.shape
+    order = np.argsort(values, axis=0, kind='stable')
+    ranks = np.empty((n, k))
+    for j in range(k):
+        ordered = values[order[:, j], j]
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        ends = np.r_[starts[1:], n]
+        ranks[order[:, j], j] = np.repeat((starts + ends + 1) / 2, ends - starts)
+    return ranks
+
+
+def pearson(values):
+    """Pearson matrix of the columns of `values`; constant columns give NaN."""
+    centered = values - values.mean(axis=0)
+    cov = centered.T @ centered
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std)
+    np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+    return corr.clip(-1, 1)
+
+
+def spearman(values):
+    return pearson(average_ranks(values))
+
+
+def tied_pairs(*columns):
+    """Pairs of rows equal in every column, the rows being sorted on these columns."""
+    n = len(columns[0])
+    change = np.zeros(max(n - 1, 0), dtype=bool)
+    for column in columns:
+        change |= column[1:] != column[:-1]
+    sizes = np.diff(np.r_[np.flatnonzero(np.r_[True, change]), n])
+    return int((sizes * (sizes - 1) // 2).sum())
+
+
+def count_inversions(sequence):
+    """Pairs i < j with sequence[i] > sequence[j], for non-negative ints below 2**31.
+
+    The values are split one bit at a time from the top, keeping the rows in
+    position order inside every group of equal higher bits: a 1 before a 0
+    in the same group is an inversion decided by that bit. Each bit is a
+    handful of linear passes, so the whole count is O(n log n).
+    """
+    values = np.array(sequence, dtype=np.int32)
+    n = len(values)
+    if n < 2 or not values.max():
+        return 0
+    inversions = 0
+    position = np.arange(n, dtype=np.int32)
+    is_start = np.ones(n, dtype=bool)
+    is_end = np.ones(n, dtype=bool)
+    for shift in range(int(values.max()).bit_length() - 1, -1, -1):
+        group = values >> (shift + 1)
+        one = ((values >> shift) & 1).astype(bool)
+        np.not_equal(group[1:], group[:-1], out=is_start[1:])
+        is_end[:-1] = is_start[1:]
+        # Ones before each row inside its group (the running count never decreases)
+        ones = np.cumsum(one, dtype=np.int32)
+        ones_before = ones - one
+        ones_before -= np.maximum.accumulate(np.where(is_start, ones_before, 0))
+        inversions += int(ones_before[~one].sum(dtype=np.int64))
+        # Stable partition of every group, zeros first: a zero moves up past the
+        # ones before it, a one moves down past the zeros after it
+        zeros = position + 1 - ones
+        zeros_after = np.minimum.accumulate(np.where(is_end, zeros, n)[::-1])[::-1] - zeros
+        target = np.where(one, position + zeros_after, position - ones_before)
+        partitioned = np.empty_like(values)
+        partitioned[target] = values
+        values = partitioned
+    return inversions
+
+
+def kendall(values):
+    """Kendall tau-b matrix of the columns of `values`."""
+    n, k = values.shape
+    dense = np.column_stack([np.unique(values[:, j], return_inverse=True)[1].ravel() for j in range(k)])
+    pairs = list(combinations(range(k), 2))
+    ties = [tied_pairs(np.sort(dense[:, j])) for j in range(k)]
+    joint, discordant = [], []
+    for a, b in pairs:
+        order = np.lexsort((dense[:, b], dense[:, a]))
+        joint.append(tied_pairs(dense[order, a], dense[order, b]))
+        discordant.append(count_inversions(dense[order, b]))
+
+    total = n * (n - 1) // 2
+    tau = np.full((k, k), np.nan)
+    for j in range(k):
+        if ties[j] < total:
+            tau[j, j] = 1.0
+    for p, (a, b) in enumerate(pairs):
+        denominator = float(total - ties[a]) * float(total - ties[b])
+        if denominator > 0:
+            numerator = total - ties[a] - ties[b] + joint[p] - 2 * discordant[p]
+            tau[a, b] = tau[b, a] = numerator / np.sqrt(denominator)
+    return tau
+
+
+RANK_METHODS = {'spearman': spearman, 'kendall': kendall}
+
+
+def sample_size(method, max_error):
+    """Rows after which `method` is within `max_error` of its full value with ~95% confidence."""
+    c, d = FISHER_VARIANCE[method]
+    return int(np.ceil(c * (Z_95 / max_error) ** 2 + d))
+
+
+def error_bound(method, rows):
+    """~95% half-width of `method` estimated on `rows` sampled rows, for any true value.
+
+    The interval of Fisher's z maps back to at most the same width in r.
+    """
+    c, d = FISHER_VARIANCE[method]
+    return Z_95 * np.sqrt(c / (rows - d))
+
+
+def rank_correlation(frame, method, max_error, seed=0):
+    """`method` correlation of the columns of `frame`, sampled when that keeps within `max_error`.
+
+    Frames longer than sample_size(method, max_error) are replaced by a
+    uniform sample of that many rows (`max_error` 0 never samples). Returns
+    the matrix (None with too few rows), the rows of `frame`, the rows used
+    and the error bound of the sample (0 when every row was used).
+    """
+    rows = len(frame)
+    values = frame.to_numpy(dtype=np.float64)
+    error = 0.0
+    if max_error > 0 and rows > sample_size(method, max_error):
+        size = sample_size(method, max_error)
+        picked = np.random.default_rng(seed).choice(rows, size, replace=False)
+        values = values[np.sort(picked)]
+        error = error_bound(method, size)
+    matrix = None
+    if len(values) > 2:
+        matrix = pd.DataFrame(RANK_METHODS[method](values), index=frame.columns, columns=frame.columns)
+    return {'matrix': matrix, 'rows': rows, 'used_rows': len(values), 'error': error}
@@ -0,0 +1,200 @@
+"""Pick up rows appended to df.csv without reloading the history.
+
+Every rerun stats df.csv. When it grew and the 64 KB before the loaded
+offset are unchanged, only the new complete lines are parsed and merged:
+the tail is kept as a row chunk with an index of its own, its cells are
+folded into the cube, the sketches and the scatter grid, and the dataset
+gets a new version so the cached payloads are recomputed from the merged
+aggregates. Anything else (a rewrite, a truncation, edited lookup csvs)
+triggers a full reload.
+"""
+import dataclasses
+import hashlib
+import io
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from cube import CUBE_AGGREGATES, CUBE_DIMENSIONS, build_cube
+from filters import build_index, extend_index
+from loader import SALES_DTYPES, SALES_FILE, data_path, frame_bytes, load_dataset, prefix_digest, with_models
+from moments import trim_mask
+from scatter import GRID_DIMENSIONS, ScatterGrid, grid_counts
+from sketch import SKETCH_DIMENSIONS, QuantileSketch, sketch_cells
+
+RELOAD = 'reload'
+# Appended row chunks kept apart before they are merged among themselves
+MAX_TAILS = 16
+# Share of the loaded rows the chunks may reach before they join them
+TAIL_FRACTION = 0.125
+
+
+def read_appended(source):
+    """(raw tail frame, tail bytes, new source) for lines appended since `source`.
+
+    Returns None when nothing changed and RELOAD when df.csv or a lookup csv
+    was modified in any other way than an append.
+    """
+    path = data_path(SALES_FILE)
+    stat = os.stat(path)
+    if (stat.st_size, stat.st_mtime_ns) == (source.get('size'), source.get('mtime_ns')):
+        return None
+    for name, mtime_ns in source['lookups'].items():
+        if os.stat(data_path(name)).st_mtime_ns != mtime_ns:
+            return RELOAD
+    offset = source['offset']
+    if stat.st_size < offset or prefix_digest(path, offset) != source['digest']:
+        return RELOAD
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        data = f.read(stat.st_size - offset)
+    # A line still being written is left for the next check
+    end = data.rfind(b'\n') + 1
+    seen = {**source, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if not end:
+        return pd.DataFrame(), b'', seen
+    tail_bytes = data[:end]
+    offset += end
+    seen.update(offset=offset, digest=prefix_digest(path, offset))
+    return pd.read_csv(io.BytesIO(header + tail_bytes)), tail_bytes, seen
+
+
+def merge_delta(cells, index, delta, dimensions, aggregates):
+    """`cells` with the reduced `delta` merged in, and `index` extended to the cells it adds.
+
+    Cells already present are combined in a copy of the measures and new
+    ones are appended, so the positions in `index` stay valid and only the
+    new cells are indexed: no regrouping or reindexing of `cells`.
+    """
+    at = pd.MultiIndex.from_frame(cells[dimensions]).get_indexer(pd.MultiIndex.from_frame(delta[dimensions]))
+    found = at >= 0
+    merged = cells.copy()
+    for column, how in aggregates.items():
+        values = merged[column].to_numpy(copy=True)
+        update = delta[column].to_numpy()[found]
+        if how == 'sum':
+            values[at[found]] += update
+        else:
+            values[at[found]] = getattr(np, f'{how}imum')(values[at[found]], update)
+        merged[column] = values
+    added = delta[~found]
+    if len(added):
+        merged = pd.concat([merged, added], ignore_index=True)
+        index = extend_index(index, build_index(added.reset_index(drop=True)), len(cells))
+    return merged, index
+
+
+def add_tail(dataset, tail):
+    """The row chunks of `dataset` plus `tail`, merged as they pile up.
+
+    Tails are merged among themselves past MAX_TAILS chunks, and into the
+    loaded rows once they hold TAIL_FRACTION of them, so every appended row
+    is copied a bounded number of times on average.
+    """
+    first_row = len(dataset.df) + sum(len(frame) for frame, _ in dataset.tails)
+    tail = tail.set_axis(pd.RangeIndex(first_row, first_row + len(tail)))
+    chunks = [*dataset.tails, (tail, build_index(tail))]
+    dtype = tail['Model'].dtype
+    if sum(len(frame) for frame, _ in chunks) > len(dataset.df) * TAIL_FRACTION:
+        df = pd.concat([with_models(frame, dtype) for frame in [dataset.df, *(frame for frame, _ in chunks)]], ignore_index=True)
+        return {'df': df, 'index': build_index(df), 'tails': ()}
+    if len(chunks) > MAX_TAILS:
+        merged = pd.concat([with_models(frame, dtype) for frame, _ in chunks])
+        chunks = [(merged, build_index(merged.reset_index(drop=True)))]
+    return {'tails': tuple(chunks)}
+
+
+def append_rows(dataset, raw_tail, tail_bytes, source):
+    """A new Dataset: `dataset` with the appended rows merged in."""
+    start = time.perf_counter()
+    models = dataset.cube['Model'].cat.categories.union(raw_tail['Model'].unique())
+    dtype = pd.CategoricalDtype(models)
+    tail = raw_tail.astype({**SALES_DTYPES, 'Model': dtype})
+
+    cube, cube_index = merge_delta(
+        with_models(dataset.cube, dtype), dataset.cube_index, build_cube(tail, dataset.trim),
+        CUBE_DIMENSIONS, CUBE_AGGREGATES,
+    )
+    sketches = {}
+    for column, sketch in dataset.sketches.items():
+        # Values past the loaded range land in the edge buckets
+        cells, index = merge_delta(
+            with_models(sketch.cells, dtype), sketch.index, sketch_cells(tail, column, sketch.edges),
+            [*SKETCH_DIMENSIONS, 'bucket'], {'count': 'sum'},
+        )
+        sketches[column] = QuantileSketch(column, sketch.edges, cells, index)
+    changes = {}
+    if dataset.streamed:
+        grid = dataset.scatter_grid
+        trimmed = tail[trim_mask(tail, dataset.trim)]
+        cells, index = merge_delta(
+            with_models(grid.cells, dtype), grid.index, grid_counts(trimmed, grid.x_edges, grid.y_edges),
+            [*GRID_DIMENSIONS, 'x_bin', 'y_bin'], {'count': 'sum'},
+        )
+        changes['scatter_grid'] = ScatterGrid(grid.x_edges, grid.y_edges, cells, index)
+    else:
+        changes.update(add_tail(dataset, tail))
+
+    memory = dict(dataset.memory)
+    if dataset.streamed:
+        memory['default_bytes'] += frame_bytes(tail)
+        memory['compact_bytes'] = (
+            frame_bytes(cube)
+            + frame_bytes(changes['scatter_grid'].cells)
+            + sum(frame_bytes(s.cells) for s in sketches.values())
+        )
+    else:
+        memory['default_bytes'] += frame_bytes(raw_tail)
+        memory['compact_bytes'] += frame_bytes(tail)
+    memory['saved_bytes'] = memory['default_bytes'] - memory['compact_bytes']
+
+    # Tells the payload keys apart; the disk cache stays under dataset.fingerprint
+    version = hashlib.sha256(f'{dataset.version}:{hashlib.sha256(tail_bytes).hexdigest()}'.encode()).hexdigest()
+    return dataclasses.replace(
+        dataset,
+        cube=cube,
+        cube_index=cube_index,
+        sketches=sketches,
+        version=version[:16],
+        memory=memory,
+        source={**source, 'rows': dataset.source['rows'] + len(tail)},
+        refresh={'rows': len(tail), 'seconds': time.perf_counter() - start},
+        **changes,
+    )
+
+
+class DatasetHolder:
+    """The process-wide dataset, swapped for an extended or reloaded one when df.csv changes."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            change = read_appended(self.dataset.source)
+            if change == RELOAD:
+                load_dataset.clear()
+                self.dataset = load_dataset()
+            elif change is not None:
+                raw_tail, tail_bytes, source = change
+                if len(raw_tail):
+                    self.dataset = append_rows(self.dataset, raw_tail, tail_bytes, source)
+                else:
+                    self.dataset = dataclasses.replace(self.dataset, source=source)
+            return self.dataset
+
+
+@st.cache_resource
+def dataset_holder():
+    return DatasetHolder(load_dataset())
+
+
+def current_dataset():
+    """The loaded dataset, first extended with any rows appended to df.csv since."""
+    return dataset_holder().current()
@@ -0,0 +1,171 @@
+from dataclasses import dataclass, field
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from filters import build_index
+
+X, Y = 'Mileage_KM', 'Price_USD'
+# The grid is kept per Model x Year only: with a Price x Mileage grid of
+# its own per cube cell it would outgrow the rows it replaces
+GRID_DIMENSIONS = ['Model', 'Year']
+
+
+@dataclass
+class ScatterGrid:
+    """2D histogram of Price vs Mileage per GRID_DIMENSIONS cell, on one grid shared by every cell.
+
+    Used when rows are not resident: the scatter of a selection is the sum
+    of its cells' (x bin, y bin) counts. Only the model and year filters
+    narrow it; the other filters leave it unchanged.
+    """
+    x_edges: np.ndarray
+    y_edges: np.ndarray
+    cells: pd.DataFrame
+    index: dict = field(default_factory=dict)
+
+
+def grid_counts(df, x_edges, y_edges):
+    """(Model, Year, x bin, y bin) counts of `df` on fixed edges."""
+    bins = len(x_edges) - 1
+    x_bin = np.clip(np.searchsorted(x_edges, df[X].to_numpy(), side='right') - 1, 0, bins - 1)
+    y_bin = np.clip(np.searchsorted(y_edges, df[Y].to_numpy(), side='right') - 1, 0, bins - 1)
+    counts = df[GRID_DIMENSIONS].assign(
+        x_bin=x_bin.astype(np.int16), y_bin=y_bin.astype(np.int16), count=np.ones(len(df), dtype=np.int64)
+    )
+    return reduce_grid_counts(counts)
+
+
+def reduce_grid_counts(counts):
+    return counts.groupby([*GRID_DIMENSIONS, 'x_bin', 'y_bin'], observed=True, sort=False)['count'].sum().reset_index()
+
+
+def build_grid(x_edges, y_edges, counts):
+    return ScatterGrid(x_edges, y_edges, counts, build_index(counts))
+
+
+def regression_line(frame):
+    """Endpoints of the least squares line of Price on Mileage, fitted on every row."""
+    x = frame[X].to_numpy(dtype=np.float64)
+    y = frame[Y].to_numpy(dtype=np.float64)
+    if len(x) < 2 or x.min() == x.max():
+        return pd.DataFrame(columns=[X, Y])
+    slope, intercept = np.polyfit(x, y, 1)
+    ends = np.array([x.min(), x.max()])
+    return pd.DataFrame({X: ends, Y: slope * ends + intercept})
+
+
+def grid_cells(x, y, bins):
+    """Flat cell number of every point on a `bins` x `bins` grid, plus the edges."""
+    x_edges = np.histogram_bin_edges(x, bins)
+    y_edges = np.histogram_bin_edges(y, bins)
+    col = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, bins - 1)
+    row = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, bins - 1)
+    return row * bins + col, x_edges, y_edges
+
+
+def binned(frame, bins):
+    """Occupied cells of a 2D histogram, with their bounds and row count."""
+    cells, x_edges, y_edges = grid_cells(frame[X].to_numpy(), frame[Y].to_numpy(), bins)
+    counts = np.bincount(cells, minlength=bins * bins)
+    occupied = np.flatnonzero(counts)
+    row, col = np.divmod(occupied, bins)
+    return pd.DataFrame({
+        f'{X}_start': x_edges[col], f'{X}_end': x_edges[col + 1],
+        f'{Y}_start': y_edges[row], f'{Y}_end': y_edges[row + 1],
+        'Vendas': counts[occupied],
+    })
+
+
+def stratified_sample(frame, max_points, bins, seed=0):
+    """About `max_points` rows, drawn from every 2D grid cell in proportion to its size.
+
+    Every occupied cell keeps at least one row, so outliers stay visible.
+    """
+    cells, _, _ = grid_cells(frame[X].to_numpy(), frame[Y].to_numpy(), bins)
+    quota = np.maximum(1, np.rint(np.bincount(cells) * (max_points / len(frame)))).astype(np.int64)
+    # Random order inside each cell, then the first `quota` rows of every cell
+    order = np.lexsort((np.random.default_rng(seed).random(len(cells)), cells))
+    sorted_cells = cells[order]
+    starts = np.searchsorted(sorted_cells, sorted_cells, side='left')
+    rank = np.arange(len(order)) - starts
+    keep = np.sort(order[rank < quota[sorted_cells]])
+    return frame[[X, Y]].iloc[keep]
+
+
+def price_mileage(corr_data, max_points, mode, bins):
+    """What the Price vs Mileage charts draw: every row up to `max_points`, then bins or a sample.
+
+    Returns {'mode': 'points' | 'bins' | 'sample', 'data', 'line', 'rows'}.
+    """
+    rows = len(corr_data)
+    if max_points <= 0 or rows <= max_points:
+        mode, data = 'points', corr_data[[X, Y]]
+    elif mode == 'sample':
+        data = stratified_sample(corr_data, max_points, bins)
+    else:
+        mode, data = 'bins', binned(corr_data, bins)
+    return {'mode': mode, 'data': data, 'line': regression_line(corr_data), 'rows': rows}
+
+
+def grid_price_mileage(grid, counts, line):
+    """price_mileage() payload from selected grid counts; `line` is (slope, intercept) or None."""
+    totals = counts.groupby(['x_bin', 'y_bin'])['count'].sum()
+    x_bin = totals.index.get_level_values('x_bin').to_numpy()
+    y_bin = totals.index.get_level_values('y_bin').to_numpy()
+    data = pd.DataFrame({
+        f'{X}_start': grid.x_edges[x_bin], f'{X}_end': grid.x_edges[x_bin + 1],
+        f'{Y}_start': grid.y_edges[y_bin], f'{Y}_end': grid.y_edges[y_bin + 1],
+        'Vendas': totals.to_numpy(),
+    })
+    ends = pd.DataFrame(columns=[X, Y])
+    if line is not None and len(data):
+        slope, intercept = line
+        x = np.array([data[f'{X}_start'].min(), data[f'{X}_end'].max()])
+        ends = pd.DataFrame({X: x, Y: slope * x + intercept})
+    return {'mode': 'bins', 'data': data, 'line': ends, 'rows': int(totals.sum()), 'model_year_only': True}
+
+
+def price_mileage_chart(payload, opacity, with_line=False):
+    """Altair chart of a price_mileage() payload."""
+    x_title, y_title = 'Quilometragem (KM)', 'Preço (USD)'
+    if payload['mode'] == 'bins':
+        chart = alt.Chart(payload['data']).mark_rect().encode(
+            x=alt.X(f'{X}_start:Q', title=x_title),
+            x2=f'{X}_end:Q',
+            y=alt.Y(f'{Y}_start:Q', title=y_title, scale=alt.Scale(zero=False)),
+            y2=f'{Y}_end:Q',
+            color=alt.Color('Vendas:Q', scale=alt.Scale(scheme='blues'), title='Vendas'),
+            tooltip=[
+                alt.Tooltip(f'{X}_start:Q', format=',.0f', title='KM de'),
+                alt.Tooltip(f'{X}_end:Q', format=',.0f', title='KM até'),
+                alt.Tooltip(f'{Y}_start:Q', format=',.0f', title='Preço de'),
+                alt.Tooltip(f'{Y}_end:Q', format=',.0f', title='Preço até'),
+                alt.Tooltip('Vendas:Q', format=','),
+            ]
+        )
+    else:
+        chart = alt.Chart(payload['data']).mark_circle(size=60, opacity=opacity).encode(
+            x=alt.X(f'{X}:Q', title=x_title),
+            y=alt.Y(f'{Y}:Q', title=y_title, scale=alt.Scale(zero=False)),
+            tooltip=[alt.Tooltip(f'{X}:Q', format=',.0f'), alt.Tooltip(f'{Y}:Q', format=',.0f')]
+        )
+    if with_line:
+        chart += alt.Chart(payload['line']).mark_line(color='red', strokeDash=[5,5]).encode(
+            x=f'{X}:Q',
+            y=f'{Y}:Q'
+        )
+    return chart
+
+
+def downsampling_caption(payload):
+    """Note shown under a downsampled chart, or None when every row is drawn."""
+    if payload['mode'] == 'bins':
+        caption = f"{payload['rows']:,} vendas agrupadas em {len(payload['data']):,} células; a cor indica a quantidade."
+        if payload.get('model_year_only'):
+            caption += " Na ingestão em blocos, só os filtros de modelo e ano se aplicam a este gráfico."
+        return caption
+    if payload['mode'] == 'sample':
+        return f"Amostra estratificada de {len(payload['data']):,} de {payload['rows']:,} vendas."
+    return None
@@ -0,0 +1,129 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from filters import build_index
+from moments import TRIM_QUANTILES, TRIMMED_COLUMNS
+
+# Dataset-wide histograms: fixed-width buckets, off by at most one bucket
+HISTOGRAM_BUCKETS = 2048
+# Per-cell sketches: equal-count buckets cut from the dataset-wide histogram
+SKETCH_BUCKETS = 32
+SKETCHED_COLUMNS = ('Price_USD', 'Mileage_KM')
+# The dimensions the filters act on; Fuel_Type and Color are never filtered
+SKETCH_DIMENSIONS = ['Model', 'Year', 'Region', 'Transmission', 'Sales_Classification']
+
+
+@dataclass
+class QuantileSketch:
+    """Histogram of one column per cell, on bucket `edges` shared by every cell.
+
+    `cells` holds the non-empty (cell, bucket) counts. Histograms over the
+    same buckets merge by adding counts, so the quantiles of any filter
+    combination come from the selected cells without touching the rows.
+    The cells are the SKETCH_DIMENSIONS combinations and every cell has at
+    most SKETCH_BUCKETS buckets, so the sketch stops growing with the rows.
+    A sketch without dimensions (only bucket and count) is a histogram of
+    the whole column.
+    """
+    column: str
+    edges: np.ndarray
+    cells: pd.DataFrame
+    index: dict = field(default_factory=dict)
+
+
+def bucket_ids(values, edges):
+    values = np.asarray(values, dtype=np.float64)
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2).astype(np.int16)
+
+
+def histogram_edges(low, high, buckets=HISTOGRAM_BUCKETS):
+    return low + np.arange(buckets + 1) * ((high - low) / buckets or 1.0)
+
+
+def column_histogram(column, counts, edges):
+    """Dataset-wide sketch of `column` from its bucket `counts`."""
+    occupied = np.flatnonzero(counts)
+    return QuantileSketch(column, edges, pd.DataFrame({'bucket': occupied, 'count': counts[occupied]}))
+
+
+def build_histogram(df, column):
+    """Dataset-wide histogram of `column` over its min and max."""
+    values = df[column]
+    edges = histogram_edges(float(values.min()), float(values.max()))
+    counts = np.bincount(bucket_ids(values, edges), minlength=len(edges) - 1)
+    return column_histogram(column, counts, edges)
+
+
+def sketch_edges(histogram, buckets=SKETCH_BUCKETS):
+    """Bucket edges holding about the same share of the rows each, read from `histogram`."""
+    inner = merged_quantiles(histogram, histogram.cells, [], np.arange(1, buckets) / buckets).iloc[0]
+    edges = np.unique(np.r_[histogram.edges[0], inner.to_numpy(), histogram.edges[-1]])
+    return edges if len(edges) > 1 else np.r_[edges, edges + 1.0]
+
+
+def reduce_sketch_cells(cells):
+    return cells.groupby([*SKETCH_DIMENSIONS, 'bucket'], observed=True, sort=False)['count'].sum().reset_index()
+
+
+def sketch_cells(df, column, edges):
+    """(cell, bucket) counts of `column` in `df` on `edges`."""
+    bucket = bucket_ids(df[column], edges)
+    return reduce_sketch_cells(df[SKETCH_DIMENSIONS].assign(bucket=bucket, count=np.ones(len(df), dtype=np.int64)))
+
+
+def build_sketch(column, edges, cells):
+    return QuantileSketch(column, edges, cells, build_index(cells))
+
+
+def build_sketches(df, histograms):
+    """Per-cell sketches of every SKETCHED_COLUMNS, on buckets cut from their `histograms`."""
+    sketches = {}
+    for column in SKETCHED_COLUMNS:
+        edges = sketch_edges(histograms[column])
+        sketches[column] = build_sketch(column, edges, sketch_cells(df, column, edges))
+    return sketches
+
+
+def trim_bounds(histograms):
+    """Dataset-wide TRIM_QUANTILES of every TRIMMED_COLUMNS, read from their histograms."""
+    bounds = {}
+    for column in TRIMMED_COLUMNS:
+        histogram = histograms[column]
+        low, high = merged_quantiles(histogram, histogram.cells, [], TRIM_QUANTILES).iloc[0]
+        bounds[column] = (float(low), float(high))
+    return bounds
+
+
+def merged_quantiles(sketch, cells, by, qs):
+    """Quantiles `qs` of the sketched column per group of `by` (one row when `by` is empty).
+
+    Ranks are interpolated linearly as pandas does, with the values inside a
+    bucket assumed evenly spread. Columns are the `qs` themselves.
+    """
+    keys = list(by) or [np.zeros(len(cells), dtype=np.int8)]
+    hist = cells.groupby([*keys, cells['bucket']], observed=True)['count'].sum()
+    if hist.empty:
+        index = pd.MultiIndex.from_arrays([[]] * len(by), names=by) if by else None
+        return pd.DataFrame(columns=list(qs), index=index, dtype=np.float64)
+    groups = hist.groupby(level=list(range(len(keys))), observed=True).sum()
+    counts = hist.to_numpy()
+    cum = counts.cumsum()
+    offsets = np.concatenate([[0], groups.to_numpy().cumsum()[:-1]])
+    totals = groups.to_numpy()
+    bucket = hist.index.get_level_values(-1).to_numpy()
+
+    table = {}
+    for q in qs:
+        # Global rank of the q-quantile of every group, then the bucket holding it
+        target = offsets + q * (totals - 1)
+        at = np.searchsorted(cum, target, side='right')
+        before = cum[at] - counts[at]
+        within = np.clip((target - before + 0.5) / counts[at], 0.0, 1.0)
+        low = sketch.edges[bucket[at]]
+        table[q] = low + within * (sketch.edges[bucket[at] + 1] - low)
+    result = pd.DataFrame(table, index=groups.index)
+    if not by:
+        result = result.reset_index(drop=True)
+    return result
@@ -0,0 +1,153 @@
+"""Out-of-core ingestion of df.csv (BMW_INGEST_MODE=stream).
+
+The csv is read in chunks of BMW_CHUNK_ROWS rows and every chunk is folded
+into the cube (sums, counts, sums of squares, co-moments), the quantile
+sketches and the Price vs Mileage grid. Only those aggregates stay resident,
+so memory no longer grows with the number of rows. The raw browser needs
+the rows themselves and is disabled in this mode.
+
+Three passes are made: the first reads three columns to learn the model
+names and the ranges of Price and Mileage, the second histograms them to
+find the trim bounds of the co-moments and the grid and the buckets of the
+sketches, the third folds.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from cube import build_cube, merge_cubes
+from filters import build_index
+from loader import (
+    SALES_DTYPES, SALES_FILE, Dataset, data_fingerprint, data_path, frame_bytes, label_dictionaries,
+    read_lookups, sales_source,
+)
+from moments import trim_mask
+from scatter import X, Y, build_grid, grid_counts, reduce_grid_counts
+from sketch import (
+    SKETCHED_COLUMNS, build_sketch, bucket_ids, column_histogram, histogram_edges, reduce_sketch_cells, sketch_cells,
+    sketch_edges, trim_bounds,
+)
+
+# Partial aggregates kept before they are merged into one
+MAX_PARTIALS = 8
+
+
+def read_chunks(path, chunk_rows, **kwargs):
+    return pd.read_csv(path, chunksize=chunk_rows, **kwargs)
+
+
+def scan(path, chunk_rows):
+    """First pass: model names, (min, max) of the sketched columns and the row count."""
+    models = set()
+    low, high = {}, {}
+    rows = 0
+    for chunk in read_chunks(path, chunk_rows, usecols=['Model', *SKETCHED_COLUMNS]):
+        rows += len(chunk)
+        models.update(chunk['Model'].unique())
+        for column in SKETCHED_COLUMNS:
+            low[column] = min(low.get(column, np.inf), float(chunk[column].min()))
+            high[column] = max(high.get(column, -np.inf), float(chunk[column].max()))
+    return sorted(models), {column: (low[column], high[column]) for column in SKETCHED_COLUMNS}, rows
+
+
+def histogram_pass(path, chunk_rows, ranges, rows):
+    """Second pass: dataset-wide histograms of the sketched columns, for the trim bounds and the sketch buckets."""
+    edges = {column: histogram_edges(*ranges[column]) for column in SKETCHED_COLUMNS}
+    counts = {column: np.zeros(len(edges[column]) - 1, dtype=np.int64) for column in SKETCHED_COLUMNS}
+    for chunk in read_chunks(path, chunk_rows, usecols=list(SKETCHED_COLUMNS), nrows=rows):
+        for column in SKETCHED_COLUMNS:
+            counts[column] += np.bincount(bucket_ids(chunk[column], edges[column]), minlength=len(counts[column]))
+    return {column: column_histogram(column, counts[column], edges[column]) for column in SKETCHED_COLUMNS}
+
+
+class Fold:
+    """Aggregates built so far; partials are merged every MAX_PARTIALS chunks."""
+
+    def __init__(self, histograms, trim, bins):
+        self.edges = {column: sketch_edges(histogram) for column, histogram in histograms.items()}
+        self.trim = trim
+        # The grid only covers the trimmed rows, as the scatter of resident rows does
+        self.x_edges = np.linspace(*trim[X], bins + 1)
+        self.y_edges = np.linspace(*trim[Y], bins + 1)
+        self.cubes = []
+        self.sketches = {column: [] for column in SKETCHED_COLUMNS}
+        self.grids = []
+        self.rows = 0
+        self.frame_bytes = 0
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        self.frame_bytes += frame_bytes(chunk)
+        self.cubes.append(build_cube(chunk, self.trim))
+        for column, edges in self.edges.items():
+            self.sketches[column].append(sketch_cells(chunk, column, edges))
+        self.grids.append(grid_counts(chunk[trim_mask(chunk, self.trim)], self.x_edges, self.y_edges))
+        if len(self.cubes) >= MAX_PARTIALS:
+            self.compact()
+
+    def compact(self):
+        self.cubes = [merge_cubes(*self.cubes)]
+        for column, parts in self.sketches.items():
+            self.sketches[column] = [reduce_sketch_cells(pd.concat(parts, ignore_index=True))]
+        self.grids = [reduce_grid_counts(pd.concat(self.grids, ignore_index=True))]
+
+
+def stream_dataset():
+    """Dataset holding only aggregates, folded from df.csv chunk by chunk."""
+    path = data_path(SALES_FILE)
+    timings = {}
+    start = time.perf_counter()
+    models, ranges, rows = scan(path, config.CHUNK_ROWS)
+    timings['varredura (passo 1)'] = time.perf_counter() - start
+
+    trim_start = time.perf_counter()
+    histograms = histogram_pass(path, config.CHUNK_ROWS, ranges, rows)
+    trim = trim_bounds(histograms)
+    timings['histogramas e limites de corte (passo 2)'] = time.perf_counter() - trim_start
+
+    dtypes = {**SALES_DTYPES, 'Model': pd.CategoricalDtype(models)}
+    fold = Fold(histograms, trim, config.SCATTER_BINS)
+    fold_start = time.perf_counter()
+    # Only the rows seen by the first pass: later appends are left to the refresh
+    for chunk in read_chunks(path, config.CHUNK_ROWS, dtype=dtypes, nrows=rows):
+        fold.add(chunk)
+    fold.compact()
+    timings['agregação em blocos (passo 3)'] = time.perf_counter() - fold_start
+    seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lookups = read_lookups()
+    version = data_fingerprint()
+    cube = fold.cubes[0]
+    sketches = {column: build_sketch(column, fold.edges[column], parts[0]) for column, parts in fold.sketches.items()}
+    grid = build_grid(fold.x_edges, fold.y_edges, fold.grids[0])
+    cube_index = build_index(cube)
+    timings['índices'] = time.perf_counter() - start
+
+    resident = frame_bytes(cube) + frame_bytes(grid.cells) + sum(frame_bytes(s.cells) for s in sketches.values())
+    return Dataset(
+        df=None,
+        lookups=lookups,
+        labels=label_dictionaries(lookups),
+        version=version,
+        fingerprint=version,
+        cube=cube,
+        cube_index=cube_index,
+        sketches=sketches,
+        trim=trim,
+        scatter_grid=grid,
+        memory={
+            'default_bytes': fold.frame_bytes,
+            'compact_bytes': resident,
+            'saved_bytes': fold.frame_bytes - resident,
+        },
+        timings=timings,
+        ingest={
+            'rows': fold.rows,
+            'seconds': seconds,
+            'rows_per_second': fold.rows / seconds if seconds else 0.0,
+        },
+        source=sales_source(fold.rows),
+    )
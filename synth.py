@@ -0,0 +1,196 @@
+"""Synthetic copies of dados/ at any scale, faithful to the sample's schema.
+
+    python synth.py --scale 100 --out dados_100x [--seed 0]
+                    [--model-skew 1.0] [--region-skew 0.5] [--year-skew 0.3]
+    BMW_DATA_DIR=dados_100x streamlit run main.py
+
+Everything but the size is read from the sample: column order, model
+names, year range, engine sizes, the ranges of Mileage, Price and Sales
+Volume, the lookup ids and the Sales Volume threshold that decides
+Sales_Classification. The sample is uniform in every column; a skew is a
+Zipf exponent giving the k-th value weight 1 / k**skew (0 keeps it uniform).
+Models and regions rank in label and lookup order, years newest first.
+
+Rows are generated and written in chunks of CHUNK_ROWS, each from its own
+seed, so any scale fits in memory and a seed always yields the same files.
+Next to the csv files the loader's columnar snapshots (.snapshot/*.arrow
+plus their metadata) are written, so the dashboard maps them on start
+instead of parsing a large csv.
+"""
+import argparse
+from dataclasses import dataclass
+import hashlib
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from loader import (
+    DATA_DIR, LOOKUP_FILES, SALES_DTYPES, SALES_FILE, frame_bytes, pa, read_lookup, snapshot_paths,
+    write_json_atomic, write_snapshot,
+)
+
+CHUNK_ROWS = 1_000_000
+SCALES = (1, 10, 100, 1000)
+
+
+@dataclass
+class SampleProfile:
+    """What the generator keeps from the sample."""
+    rows: int
+    columns: list
+    models: list
+    years: list
+    engine_sizes: np.ndarray
+    ranges: dict
+    lookup_ids: dict
+    high_id: int
+    low_id: int
+    high_volume: int
+
+
+def profile_sample(data_dir=DATA_DIR):
+    df = pd.read_csv(os.path.join(data_dir, SALES_FILE))
+    lookups = {column: pd.read_csv(os.path.join(data_dir, name)) for column, name in LOOKUP_FILES.items()}
+    classes = lookups['Sales_Classification'].set_index('Sales_Classification')['Id']
+    high_id, low_id = int(classes['High']), int(classes['Low'])
+    return SampleProfile(
+        rows=len(df),
+        columns=list(df.columns),
+        models=sorted(df['Model'].unique()),
+        years=list(range(int(df['Year'].min()), int(df['Year'].max()) + 1)),
+        engine_sizes=np.sort(df['Engine_Size_L'].unique()),
+        # Half-open [low, high + 1): the sample looks uniform over whole numbers
+        ranges={
+            column: (int(df[column].min()), int(df[column].max()) + 1)
+            for column in ('Mileage_KM', 'Price_USD', 'Sales_Volume')
+        },
+        lookup_ids={column: lookup['Id'].to_numpy() for column, lookup in lookups.items()},
+        high_id=high_id,
+        low_id=low_id,
+        high_volume=int(df.loc[df['Sales_Classification'] == high_id, 'Sales_Volume'].min()),
+    )
+
+
+def zipf_weights(count, skew):
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_chunk(profile, rows, rng, skews):
+    """`rows` rows in the sample's columns and default csv dtypes."""
+    ids = profile.lookup_ids
+    volume = rng.integers(*profile.ranges['Sales_Volume'], size=rows)
+    chunk = {
+        'Model': np.asarray(profile.models, dtype=object)[
+            rng.choice(len(profile.models), size=rows, p=zipf_weights(len(profile.models), skews['Model']))
+        ],
+        'Year': np.asarray(profile.years[::-1])[
+            rng.choice(len(profile.years), size=rows, p=zipf_weights(len(profile.years), skews['Year']))
+        ],
+        'Engine_Size_L': rng.choice(profile.engine_sizes, size=rows),
+        'Mileage_KM': rng.integers(*profile.ranges['Mileage_KM'], size=rows),
+        'Price_USD': rng.integers(*profile.ranges['Price_USD'], size=rows),
+        'Sales_Volume': volume,
+        'Sales_Classification': np.where(volume >= profile.high_volume, profile.high_id, profile.low_id),
+        'Region': ids['Region'][
+            rng.choice(len(ids['Region']), size=rows, p=zipf_weights(len(ids['Region']), skews['Region']))
+        ],
+    }
+    for column in ('Fuel_Type', 'Color', 'Transmission'):
+        chunk[column] = rng.choice(ids[column], size=rows)
+    return pd.DataFrame(chunk)[profile.columns]
+
+
+def write_sales(profile, out, rows, seed, skews, columnar):
+    """Write df.csv chunk by chunk, and its snapshot when `columnar`."""
+    csv_path = os.path.join(out, SALES_FILE)
+    arrow_path, meta_path = snapshot_paths(SALES_FILE, out)
+    models = pd.CategoricalDtype(pd.Index(profile.models))
+    digest = hashlib.sha256()
+    default_bytes = 0
+    writer = None
+    if columnar:
+        os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+        tmp = f'{arrow_path}.{os.getpid()}.tmp'
+    with open(csv_path, 'wb') as f:
+        for number, start in enumerate(range(0, rows, CHUNK_ROWS)):
+            rng = np.random.default_rng([seed, number])
+            chunk = generate_chunk(profile, min(CHUNK_ROWS, rows - start), rng, skews)
+            text = chunk.to_csv(index=False, header=number == 0).encode()
+            digest.update(text)
+            f.write(text)
+            default_bytes += frame_bytes(chunk)
+            if columnar:
+                table = pa.Table.from_pandas(chunk.astype({**SALES_DTYPES, 'Model': models}), preserve_index=False)
+                if writer is None:
+                    writer = pa.ipc.new_file(tmp, table.schema)
+                writer.write_table(table)
+    if writer is not None:
+        writer.close()
+        os.replace(tmp, arrow_path)
+        # The same record the loader keeps, so it trusts the snapshot without hashing the csv
+        stat = os.stat(csv_path)
+        write_json_atomic(meta_path, {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': digest.hexdigest(),
+            'default_bytes': default_bytes,
+            'rows': rows,
+            'offset': stat.st_size,
+        })
+
+
+def write_lookups(out, columnar, data_dir=DATA_DIR):
+    for name in LOOKUP_FILES.values():
+        csv_path = os.path.join(out, name)
+        shutil.copyfile(os.path.join(data_dir, name), csv_path)
+        if columnar:
+            frame, default_bytes = read_lookup(csv_path)
+            write_snapshot(frame, csv_path, *snapshot_paths(name, out), default_bytes)
+
+
+def generate(out, scale=1, rows=None, seed=0, skews=None, columnar=True):
+    """Write a synthetic dataset to `out`; `rows` defaults to `scale` times the sample."""
+    profile = profile_sample()
+    skews = {'Model': 0.0, 'Region': 0.0, 'Year': 0.0, **(skews or {})}
+    rows = rows or scale * profile.rows
+    columnar = columnar and pa is not None
+    os.makedirs(out, exist_ok=True)
+    write_lookups(out, columnar)
+    write_sales(profile, out, rows, seed, skews, columnar)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', required=True, help='directory to write (served with BMW_DATA_DIR)')
+    parser.add_argument('--scale', type=int, default=1, help=f'multiple of the sample rows, usually one of {SCALES}')
+    parser.add_argument('--rows', type=int, help='exact row count, overriding --scale')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model-skew', type=float, default=0.0)
+    parser.add_argument('--region-skew', type=float, default=0.0)
+    parser.add_argument('--year-skew', type=float, default=0.0)
+    parser.add_argument('--no-columnar', action='store_true', help='write the csv files only')
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.out) == os.path.abspath(DATA_DIR):
+        parser.error('--out would overwrite the sample it is generated from')
+    start = time.perf_counter()
+    rows = generate(
+        args.out,
+        scale=args.scale,
+        rows=args.rows,
+        seed=args.seed,
+        skews={'Model': args.model_skew, 'Region': args.region_skew, 'Year': args.year_skew},
+        columnar=not args.no_columnar,
+    )
+    print(f'{rows:,} linhas gravadas em {args.out} em {time.perf_counter() - start:.1f} s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
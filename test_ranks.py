@@ -0,0 +1,89 @@
+"""ranks.py against brute-force references: O(n²) pair counts for Kendall
+tau-b and count_inversions, average ranks from the definition for Spearman.
+
+Run with `python -m pytest test_ranks.py`.
+"""
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ranks import average_ranks, count_inversions, kendall, spearman
+
+
+def brute_inversions(sequence):
+    return sum(sequence[i] > sequence[j] for i, j in combinations(range(len(sequence)), 2))
+
+
+def brute_tau_b(x, y):
+    concordant = discordant = ties_x = ties_y = 0
+    for i, j in combinations(range(len(x)), 2):
+        dx, dy = np.sign(x[i] - x[j]), np.sign(y[i] - y[j])
+        ties_x += dx == 0
+        ties_y += dy == 0
+        if dx and dy:
+            concordant += dx == dy
+            discordant += dx != dy
+    total = len(x) * (len(x) - 1) // 2
+    denominator = (total - ties_x) * (total - ties_y)
+    return (concordant - discordant) / np.sqrt(denominator) if denominator else np.nan
+
+
+def brute_average_ranks(column):
+    """1 + the values below, plus half the other values equal."""
+    return np.array([(column < v).sum() + ((column == v).sum() + 1) / 2 for v in column])
+
+
+def samples():
+    rng = np.random.default_rng(7)
+    yield 'distinct', rng.normal(size=(60, 3))
+    yield 'ties', rng.integers(0, 5, size=(80, 3)).astype(np.float64)
+    yield 'mixed', np.column_stack([rng.integers(0, 3, 50), rng.normal(size=50), rng.integers(0, 20, 50)]).astype(np.float64)
+    yield 'constant', np.column_stack([np.full(30, 2.0), rng.normal(size=30), rng.integers(0, 2, 30)])
+    yield 'reversed', np.column_stack([np.arange(40.0), np.arange(40.0)[::-1], np.arange(40.0) % 7])
+
+
+SAMPLES = dict(samples())
+
+
+@pytest.mark.parametrize('sequence', [
+    [],
+    [0],
+    [3, 3, 3],
+    [0, 1, 2, 3],
+    [3, 2, 1, 0],
+    [2, 0, 2, 1, 0, 2],
+    [5, 1, 4, 1, 0, 9, 2, 6, 5, 3],
+])
+def test_count_inversions_small(sequence):
+    assert count_inversions(sequence) == brute_inversions(sequence)
+
+
+@pytest.mark.parametrize('high', [2, 17, 1000, 2**31 - 1])
+def test_count_inversions_random(high):
+    sequence = np.random.default_rng(high).integers(0, high, 300)
+    assert count_inversions(sequence) == brute_inversions(sequence)
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_average_ranks(name):
+    values = SAMPLES[name]
+    expected = np.column_stack([brute_average_ranks(values[:, j]) for j in range(values.shape[1])])
+    np.testing.assert_allclose(average_ranks(values), expected)
+    np.testing.assert_allclose(average_ranks(values), pd.DataFrame(values).rank().to_numpy())
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_kendall_tau_b(name):
+    values = SAMPLES[name]
+    k = values.shape[1]
+    expected = np.array([[brute_tau_b(values[:, a], values[:, b]) for b in range(k)] for a in range(k)])
+    np.testing.assert_allclose(kendall(values), expected, equal_nan=True)
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_spearman(name):
+    values = SAMPLES[name]
+    expected = pd.DataFrame(values).corr(method='spearman').to_numpy()
+    np.testing.assert_allclose(spearman(values), expected, equal_nan=True)